@@ -6,6 +6,49 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     ORS_API_KEY: str = ""
     ORS_URL: str = ""
+    ORS_MAX_WORKERS: int = 8
+    # Requests per second and burst allowed by the quota of the public ORS API, a rate of 0 disables the limit.
+    ORS_RATE_LIMIT: float = 40 / 60
+    # Requests per second to the own ORS instance at ORS_URL, unlimited by default.
+    ORS_URL_RATE_LIMIT: float = 0
+    ORS_BURST: int = 40
+    ORS_RETRIES: int = 4
+    ORS_BACKOFF: float = 0.5
+    # Maximum number of sources times destinations of an ORS matrix request.
+    ORS_MATRIX_SIZE: int = 3500
+    # Total size in bytes of the directions results kept in memory and in the SQLite file at DIRECTIONS_CACHE_PATH.
+    DIRECTIONS_CACHE_SIZE: int = 32 * 1024 * 1024
+    DIRECTIONS_CACHE_PATH: str = "./application/cache/directions.sqlite"
+    DIRECTIONS_CACHE_DISK_SIZE: int = 1024 * 1024 * 1024
+    DIRECTIONS_CACHE_PRECISION: int = 6
+    # "ors" requests directions from ORS, "local" computes them on the road graph at ROUTING_GRAPH_PATH.
+    ROUTING_ENGINE: str = "ors"
+    ROUTING_GRAPH_PATH: str = "./application/assets/road_graph.graphml"
+    # Random orders are snapped to the roads of the graph at ROUTING_GRAPH_PATH if it exists, and by OSRM otherwise.
+    # A random point further than ORDER_SNAP_DISTANCE metres from a road is replaced by another one if possible.
+    ORDER_SNAP_DISTANCE: float = 250.0
+    # Maximum number of deliveries in one upload to /map/deliveries, and in all uploads that are kept together.
+    DELIVERY_UPLOAD_MAX_ROWS: int = 500000
+    # Maximum size in bytes of one upload to /map/deliveries, larger uploads are refused before they are read.
+    DELIVERY_UPLOAD_MAX_BYTES: int = 64 * 1024 * 1024
+    DELIVERY_STORE_SIZE: int = 2000000
+    # Random orders are generated on ORDER_MAX_WORKERS threads shared by all requests, which bounds the requests to OSRM.
+    ORDER_MAX_WORKERS: int = 16
+    ORDER_TIMEOUT: float = 10.0
+    TILE_CACHE_SIZE: int = 4096
+    TILE_RESULTS_SIZE: int = 32
+    # Distance in metres within which a route counts as driving on an autonomous road.
+    AUTONOMOUS_TOLERANCE: float = 25.0
+    # Total size in bytes of the encoded /map/geojson results kept, and the number of seconds they are kept.
+    RESULT_CACHE_SIZE: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL: int = 3600
+    RESULT_CACHE_WARM: bool = True
+    # Route computations submitted to /map/jobs run on JOB_WORKERS threads, at most JOB_QUEUE_SIZE are accepted at once.
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_SIZE: int = 16
+    JOB_HISTORY_SIZE: int = 128
+    JOB_RETRY_AFTER: int = 30
+    METRICS_ENABLED: bool = True
 
     class Config:
         env_file = ".env"
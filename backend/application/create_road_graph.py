@@ -0,0 +1,10 @@
+import osmnx as ox
+
+
+# Prepares the road graph used by the local routing engine (ROUTING_ENGINE=local).
+# Warning, running this for big area's (such as the netherlands) will take a long time and a lot of memory.
+if __name__ == "__main__":
+  graph = ox.graph_from_place("Zuid-Holland, Netherlands", network_type="drive", simplify=True)
+
+  # Overrides file if already present
+  ox.save_graphml(graph, filename="road_graph.graphml", folder="./application/assets")
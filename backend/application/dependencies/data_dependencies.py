@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Tuple
 
 import pandas as pd
-from fastapi import Body
+from fastapi import Body, Header, HTTPException
 from application.models.Vehicle import Vehicle
 
 from application.models.Delivery import Delivery
@@ -10,15 +10,28 @@ from application.models.Depot import Depot
 
 from application.models.Scenario import Scenario
 
+from application.services.asset_store import assets
+from application.services.delivery_upload import uploads
+from application.services.metrics import timed
 
-def deliveries_param(deliveries: List[Delivery] = Body(None)) -> List[Delivery]:
+
+def deliveries_param(deliveries: List[Delivery] = Body(None), deliveries_handle: str = None) -> List[Delivery]:
     """
     Must be used as FastAPI Dependency injection.
     Checks the deleveries passed in the request and returns them if present.
+    If a handle of deliveries uploaded to /map/deliveries is passed instead, those deliveries are returned.
     Else, deliveries are loaded from file and returned.
     :param deliveries: An optional list of deliveries.
+    :param deliveries_handle: An optional handle of uploaded deliveries.
     :return: A list of deliveries.
     """
+    if deliveries_handle is not None and deliveries is not None:
+        raise HTTPException(status_code=422, detail="Pass either deliveries or deliveries_handle, not both.")
+    if deliveries_handle is not None:
+        table = uploads.get(deliveries_handle)
+        if table is None:
+            raise HTTPException(status_code=404, detail="Uploaded deliveries not found.")
+        return table
     if not deliveries:
         deliveries = load_deliveries('./application/assets/deliveries.csv')
     return deliveries
@@ -46,11 +59,51 @@ def scenario_param(scenario: Scenario = Body(None)) -> Scenario:
     :return: A scenario object
     """
     if not scenario:
-        scenario = Scenario.read_from_file('./application/assets/sample_scenario.txt')
+        scenario = assets.get('./application/assets/sample_scenario.txt', Scenario.read_from_file)
     return scenario
 
 
-def load_vehicles(file_path: str):
+def stream_param(stream: bool = False, accept: str = Header(None)) -> bool:
+    """
+    Must be used as FastAPI Dependency injection.
+    Checks whether the response should be streamed as newline delimited JSON, either because the stream parameter is
+    set or because the request accepts application/x-ndjson.
+    :param stream: An optional flag to request a streamed response.
+    :param accept: The Accept header of the request.
+    :return: True if the response should be streamed.
+    """
+    return stream or (accept is not None and "application/x-ndjson" in accept)
+
+
+def load_vehicles(file_path: str) -> Tuple[Vehicle, ...]:
+    """
+    Retrieves the vehicles of a csv file from the asset store.
+    :param file_path: the path to the csv file.
+    :return: Tuple of vehicle models, which must not be modified.
+    """
+    return assets.get(file_path, read_vehicles)
+
+
+def load_deliveries(file_path: str) -> Tuple[Delivery, ...]:
+    """
+    Retrieves the deliveries of a csv file from the asset store.
+    :param file_path: the path to the csv file.
+    :return: Tuple of delivery models, which must not be modified.
+    """
+    return assets.get(file_path, read_deliveries)
+
+
+def load_depots(file_path: str) -> Tuple[Depot, ...]:
+    """
+    Retrieves the depots of a csv file from the asset store.
+    :param file_path: the path to the csv file.
+    :return: Tuple of depot models, which must not be modified.
+    """
+    return assets.get(file_path, read_depots)
+
+
+@timed("load_vehicles")
+def read_vehicles(file_path: str):
     """
     Parses the csv file to a list of vehicle models.
     :param file_path: the path to the csv file to be parsed.
@@ -66,7 +119,8 @@ def load_vehicles(file_path: str):
     return vs
 
 
-def load_deliveries(content: str) -> List[Delivery]:
+@timed("load_deliveries")
+def read_deliveries(content: str) -> List[Delivery]:
     """
     Parses the csv file to a list of delivery models.
     :param content: the csv file to be parsed
@@ -82,7 +136,8 @@ def load_deliveries(content: str) -> List[Delivery]:
     return dlvs
 
 
-def load_depots(file_path):
+@timed("load_depots")
+def read_depots(file_path):
     """
     Parses the csv file to a list of depot models.
     :return: List of depots
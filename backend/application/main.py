@@ -1,9 +1,11 @@
 import os
+import threading
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from application.routes import map, orders, compare, autonomous, settings
+from application.routes import map, orders, compare, autonomous, settings, metrics
+from application.services import metrics as metrics_service
 
 app = FastAPI()
 
@@ -13,6 +15,17 @@ app.include_router(orders.router, prefix='/orders')
 app.include_router(compare.router, prefix='/compare')
 app.include_router(settings.router, prefix='/settings')
 app.include_router(autonomous.router, prefix='/autonomous')
+app.include_router(metrics.router)
+
+if metrics_service.ENABLED:
+    app.middleware("http")(metrics_service.track_requests)
+
+
+@app.on_event("startup")
+def warm_result_cache():
+    # The default results are computed in the background, so that the api is available right away.
+    threading.Thread(target=map.warm_result_cache, daemon=True).start()
+
 
 origins = ["http://localhost:8080", "http://127.0.0.1:8080"]
 
@@ -22,6 +35,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Result-Id"],
 )
 
 if __name__ == '__main__':
@@ -1,17 +1,82 @@
-import json
-
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException
+from starlette.responses import Response
 
+from application.config import Settings
 from application.models.GeoJSON import FeatureCollection
+from application.services import autonomous_roads
+from application.services.fast_json import FastJSONResponse
+from application.services.static_layer import is_not_modified, choose_encoding
+from application.services.vector_tiles import TileCache, make_tile, is_valid_tile
+
+settings = Settings(_env_file='./application/.env')
 
 router = APIRouter()
 
+tile_cache = TileCache(settings.TILE_CACHE_SIZE)
+
 
 @router.get("/geojson", response_model=FeatureCollection)
-def get_geojson():
+def get_geojson(if_none_match: str = Header(None), if_modified_since: str = Header(None),
+                accept_encoding: str = Header(None)):
     """
     Returns the autonomous roads parsed from file.
+    The file is kept in memory pre-encoded and compressed, and supports conditional requests.
+    :param if_none_match: The ETag of the roads the client already has.
+    :param if_modified_since: The modification date of the roads the client already has.
+    :param accept_encoding: The encodings the client accepts.
     :return: The collection of roads that can be traversed autonomously, in GeoJSON format.
     """
-    with open('./application/assets/nederlandse_grote_wegen.geojson') as f:
-        return json.load(f)
+    try:
+        layer = autonomous_roads.roads.get()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The autonomous roads file is not available.")
+
+    headers = {"ETag": layer.etag, "Last-Modified": layer.last_modified, "Vary": "Accept-Encoding"}
+    if is_not_modified(layer, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    # The file is trusted to be valid GeoJSON, so it is not validated against the FeatureCollection model.
+    encoding, body = choose_encoding(layer, accept_encoding)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+def get_tile(z: int, x: int, y: int):
+    """
+    Returns a Mapbox Vector Tile of the autonomous roads, with the roads in the layer "roads".
+    :param z: The zoom level of the tile.
+    :param x: The column of the tile.
+    :param y: The row of the tile.
+    :return: The encoded tile, which is empty if there are no roads in the tile.
+    """
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile does not exist.")
+    try:
+        layer, road_index = autonomous_roads.get_road_index()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The autonomous roads file is not available.")
+
+    tile = tile_cache.get((layer.etag, z, x, y), lambda: make_tile({"roads": road_index}, z, x, y))
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile", headers={"ETag": layer.etag})
+
+
+@router.get("/query", response_model=FeatureCollection)
+def query_roads(bbox: str):
+    """
+    Returns the autonomous roads that intersect a bounding box.
+    :param bbox: The bounding box as "west,south,east,north" in degrees.
+    :return: The collection of roads in the bounding box, in GeoJSON format.
+    """
+    try:
+        bounds = tuple(float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="The bounding box must consist of numbers.")
+    if len(bounds) != 4 or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+        raise HTTPException(status_code=400, detail="The bounding box must be given as west,south,east,north.")
+    try:
+        features = autonomous_roads.query_roads(bounds)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The autonomous roads file is not available.")
+    return FastJSONResponse({"type": "FeatureCollection", "features": features})
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from fastapi.responses import StreamingResponse
+from starlette.responses import Response
 from geojson import Feature, FeatureCollection, Point
 import openrouteservice
-import pandas
 from typing import List, Optional
-import json
-import copy
+import bisect
 import collections
+import concurrent.futures
+import threading
+import uuid
+
+import numpy as np
 
 from application.models.Depot import Depot
 from application.models.Delivery import Delivery
@@ -14,18 +21,47 @@ from application.models.Vehicle import Vehicle
 from application.models.Scenario import Scenario
 
 from application.config import Settings
-
-from application.dependencies.data_dependencies import deliveries_param, vehicles_param, scenario_param
+from application.services.almende_output import read_almende
+from application.services.autonomous_roads import get_autonomous_segments
+from application.services.delivery_upload import UploadError, parse_deliveries, upload_format, uploads
+from application.services.directions_cache import DirectionsCache
+from application.services.road_router import EARTH_RADIUS, get_router
+from application.services.fast_json import dumps
+from application.services.jobs import JobQueue, QueueFull
+from application.services.metrics import timed, count_cache
+from application.services.ors_gateway import get_gateway
+from application.services.result_cache import ResultCache, canonical_key
+from application.services.spatial_index import FeatureIndex
+from application.services.vector_tiles import TileCache, make_tile, is_valid_tile
+
+from application.dependencies.data_dependencies import deliveries_param, vehicles_param, scenario_param, \
+    stream_param, load_depots
 
 settings = Settings(_env_file='./application/.env')
+directions_cache = DirectionsCache(settings.DIRECTIONS_CACHE_SIZE, settings.DIRECTIONS_CACHE_PATH,
+                                   settings.DIRECTIONS_CACHE_DISK_SIZE, settings.DIRECTIONS_CACHE_PRECISION)
 
 router = APIRouter()
 
+# Recently computed route results by result id, kept to serve them as vector tiles.
+route_results = collections.OrderedDict()
+results_lock = threading.Lock()
+tile_cache = TileCache(settings.TILE_CACHE_SIZE)
+# Encoded results of /map/geojson by the canonical key of their inputs.
+result_cache = ResultCache(settings.RESULT_CACHE_SIZE, settings.RESULT_CACHE_TTL)
+job_queue = JobQueue(settings.JOB_WORKERS, settings.JOB_QUEUE_SIZE, settings.JOB_HISTORY_SIZE)
+
+AlmendeLookup = collections.namedtuple('AlmendeLookup', 'locations pickups origins destinations')
+Waypoint = collections.namedtuple('Waypoint', 'feature previous')
+VehicleTimeline = collections.namedtuple('VehicleTimeline', 'actions minutes origins targets modes')
+ActionFactory = collections.namedtuple('ActionFactory', 'num action lookup vehicle timeline minute location')
+
 
 @router.post("/geojson", response_model=ORSResult)
 def get_geojson(algorithm: int, deliveries: Optional[List[Delivery]] = Depends(deliveries_param),
                 vehicles: Optional[List[Vehicle]] = Depends(vehicles_param),
-                scenario: Optional[Scenario] = Depends(scenario_param)):
+                scenario: Optional[Scenario] = Depends(scenario_param),
+                stream: bool = Depends(stream_param)):
     """
     Loads the dummy depot, vehicle and delivery data, and optimizes routes based on that.
     If no deliveries or vehicles are specified, they are loaded from file.
@@ -33,40 +69,278 @@ def get_geojson(algorithm: int, deliveries: Optional[List[Delivery]] = Depends(d
     :param deliveries: an optional list of deliveries to use for the routes.
     :param vehicles: an optional list of vehicles to use to do the deliveries.
     :param scenario: an optional object containing information about a scenario.
+    :param stream: whether to stream the features as newline delimited JSON, one feature per line, as soon as the
+    route they belong to is converted.
     :return: an object containing the GeoJSON that can be visualised, and the routes.
     """
+    depots = load_depots('./application/assets/depots.csv')
+    key = canonical_key(algorithm, deliveries, vehicles, depots, scenario, settings.ROUTING_ENGINE)
+    cached = result_cache.get(key)
+    count_cache("results", cached is not None)
+    if cached is not None:
+        if stream:
+            return stream_features(iter(cached.value[0]["features"]))
+        return cached_response(cached)
+
     if algorithm == 0:
         # ORS optimization
-        depots = load_depots('./application/assets/depots.csv')
         ors = ors_request(deliveries, vehicles, depots)
-        return {
-            'geojson': make_ors_geojson(ors, vehicles, depots)
-        }
+        if stream:
+            return stream_features(cache_features(key, iter_ors_geojson(ors, vehicles, depots)))
+        return cached_response(cache_result(key, make_ors_geojson(ors, vehicles, depots)))
     elif algorithm == 1:
         # Almende algorithm
         almende = almende_request(scenario)
-        almende_geojson = make_almende_geojson(almende)
-        return {
-            'geojson': almende_geojson
-        }
+        if stream:
+            return stream_features(cache_features(key, iter_almende_geojson(almende)))
+        return cached_response(cache_result(key, make_almende_geojson(almende)))
+
+
+@router.post("/deliveries", status_code=201)
+async def upload_deliveries(request: Request):
+    """
+    Stores a large set of deliveries uploaded as a CSV, Parquet or Arrow IPC file, with the columns of deliveries.csv,
+    so that /map/geojson and /map/jobs can use them by passing the returned handle as deliveries_handle.
+    The format is taken from the Content-Type header, for example text/csv or application/vnd.apache.parquet.
+    :param request: The request, of which the body is the file.
+    :return: the handle of the deliveries and the number of deliveries.
+    """
+    try:
+        upload_format(request.headers.get("content-type"))
+    except UploadError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    too_large = "The upload is larger than " + str(settings.DELIVERY_UPLOAD_MAX_BYTES) + " bytes"
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.DELIVERY_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=too_large)
+    # The length is not known for chunked uploads, so the size is checked while reading as well.
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.DELIVERY_UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=too_large)
+    try:
+        table = await run_in_threadpool(parse_deliveries, bytes(body), request.headers.get("content-type"))
+    except UploadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    uploads.put(table)
+    return {"handle": table.handle, "count": len(table)}
+
+
+@router.post("/jobs", status_code=202)
+def submit_job(algorithm: int, deliveries: Optional[List[Delivery]] = Depends(deliveries_param),
+               vehicles: Optional[List[Vehicle]] = Depends(vehicles_param),
+               scenario: Optional[Scenario] = Depends(scenario_param)):
+    """
+    Queues the computation of the routes that /map/geojson returns, to be polled at /map/jobs/{job_id}.
+    :param algorithm: the algorithm specifier of the algorithm that should be used.
+    :param deliveries: an optional list of deliveries to use for the routes.
+    :param vehicles: an optional list of vehicles to use to do the deliveries.
+    :param scenario: an optional object containing information about a scenario.
+    :return: the status of the job, including its id.
+    """
+    if algorithm not in (0, 1):
+        raise HTTPException(status_code=400, detail="Unknown algorithm.")
+    try:
+        job = job_queue.submit(lambda progress: compute_result(algorithm, deliveries, vehicles, scenario, progress))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Too many jobs are queued, try again later.",
+                            headers={"Retry-After": str(settings.JOB_RETRY_AFTER)})
+    return job.to_dict()
 
 
-def load_depots(csv_path: str) -> List[Depot]:
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
     """
-    Parses the csv file to a list of depot models.
-    :param csv_path: the csv file to be parsed
-    :return: List of depot models
+    Returns the status of a job, with its progress in vehicles converted out of the total number of vehicles.
+    :param job_id: The identifier of the job.
+    :return: the status of the job.
     """
-    depots_data = pandas.read_csv(
-        csv_path,
-        index_col="ID"
-    )
-    deps = []
-    for depot in depots_data.itertuples():
-        deps.append(Depot.from_csv_tuple(depot))
-    return deps
+    return get_known_job(job_id).to_dict()
+
+
+@router.get("/jobs/{job_id}/result", response_model=ORSResult)
+async def get_job_result(job_id: str):
+    """
+    Returns the result of a finished job, in the same format as /map/geojson.
+    :param job_id: The identifier of the job.
+    :return: an object containing the GeoJSON that can be visualised, and the routes.
+    """
+    job = get_known_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="Job is not finished.")
+    return cached_response(job.result)
+
+
+def get_known_job(job_id: str):
+    """
+    :param job_id: The identifier of the job.
+    :return: The Job.
+    :raises HTTPException: If the job is not known.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+def compute_result(algorithm, deliveries, vehicles, scenario, progress):
+    """
+    Computes the result of /map/geojson, or takes it from the result cache, reporting the vehicles converted.
+    :param algorithm: the algorithm specifier of the algorithm that should be used.
+    :param deliveries: the list of deliveries to use for the routes.
+    :param vehicles: the list of vehicles to use to do the deliveries.
+    :param scenario: the object containing information about a scenario.
+    :param progress: A function that is called with the number of vehicles converted and the total number of vehicles.
+    :return: The CachedResult.
+    """
+    depots = load_depots('./application/assets/depots.csv')
+    key = canonical_key(algorithm, deliveries, vehicles, depots, scenario, settings.ROUTING_ENGINE)
+    cached = result_cache.get(key)
+    count_cache("results", cached is not None)
+    if cached is not None:
+        return cached
+
+    if algorithm == 0:
+        ors = ors_request(deliveries, vehicles, depots)
+        features, total = iter_ors_geojson(ors, vehicles, depots), len(ors['routes'])
+    else:
+        almende = almende_request(scenario)
+        features, total = iter_almende_geojson(almende), len(almende.vehicles)
+    done = 0
+    progress(done, total)
+    generated = []
+    for ft in features:
+        generated.append(ft)
+        if ft["properties"]["type"] == "route":
+            done += 1
+            progress(done, total)
+    return cache_result(key, FeatureCollection(generated))
+
+
+@timed("encode")
+def cache_result(key, feature_collection):
+    """
+    Encodes a computed result and keeps it in the result cache.
+    The GeoJSON is built here and matches ORSResult, so it is encoded directly instead of validated again.
+    :param key: The canonical key of the inputs of the result.
+    :param feature_collection: The FeatureCollection of the result.
+    :return: The CachedResult.
+    """
+    body = dumps({'geojson': feature_collection})
+    return result_cache.put(key, body, (feature_collection, register_result(feature_collection)))
+
 
+def cache_features(key, features):
+    """
+    Passes on the features of a result while they are generated, and keeps the result in the result cache once all
+    features are generated.
+    :param key: The canonical key of the inputs of the result.
+    :param features: A generator of the features of the result.
+    :return: A generator of the same features.
+    """
+    generated = []
+    for ft in features:
+        generated.append(ft)
+        yield ft
+    cache_result(key, FeatureCollection(generated))
+
+
+def cached_response(cached):
+    """
+    Creates the response of /map/geojson for a cached result.
+    :param cached: The CachedResult.
+    :return: A Response with the encoded result, and the identifier to request its tiles in the X-Result-Id header.
+    """
+    geojson, result_id = cached.value
+    return Response(content=cached.body, media_type="application/json",
+                    headers={"X-Result-Id": register_result(geojson, result_id)})
+
+
+def warm_result_cache():
+    """
+    Computes the results of both algorithms for the default deliveries, vehicles and scenario, so that the first
+    requests without a body are answered from the result cache. Failures, for example when ORS is unreachable, are
+    printed and otherwise ignored.
+    """
+    if not settings.RESULT_CACHE_WARM:
+        return
+    for algorithm in (0, 1):
+        try:
+            get_geojson(algorithm, deliveries_param(None), vehicles_param(None), scenario_param(None), False)
+        except Exception as e:
+            print(e)
+
+
+@router.get("/tiles/{result_id}/{z}/{x}/{y}")
+def get_tile(result_id: str, z: int, x: int, y: int):
+    """
+    Returns a Mapbox Vector Tile of a computed result, with the routes in the layer "routes" and all other features,
+    such as deliveries and depots, in the layer "stops".
+    :param result_id: The identifier of the result, as returned in the X-Result-Id header of /map/geojson.
+    :param z: The zoom level of the tile.
+    :param x: The column of the tile.
+    :param y: The row of the tile.
+    :return: The encoded tile, which is empty if the result has no features in the tile.
+    """
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile does not exist.")
+    layers = get_result_layers(result_id)
+    if layers is None:
+        raise HTTPException(status_code=404, detail="Result not found.")
 
+    tile = tile_cache.get((result_id, z, x, y), lambda: make_tile(layers, z, x, y))
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
+
+
+def register_result(feature_collection, result_id: str = None) -> str:
+    """
+    Keeps a computed result to serve it as vector tiles, forgetting the oldest results when there are too many.
+    :param feature_collection: The FeatureCollection of the result.
+    :param result_id: The identifier the result had before, if it is registered again.
+    :return: The identifier of the result.
+    """
+    if result_id is None:
+        result_id = uuid.uuid4().hex
+    with results_lock:
+        if result_id in route_results:
+            route_results.move_to_end(result_id)
+        else:
+            route_results[result_id] = [feature_collection, None]
+        while len(route_results) > settings.TILE_RESULTS_SIZE:
+            route_results.popitem(last=False)
+    return result_id
+
+
+def get_result_layers(result_id: str):
+    """
+    Retrieves the spatially indexed tile layers of a result, indexing the result on first use.
+    :param result_id: The identifier of the result.
+    :return: A dict of FeatureIndex objects by layer name, or None if the result is not kept.
+    """
+    with results_lock:
+        result = route_results.get(result_id)
+        if result is not None and result[1] is None:
+            features = result[0]["features"]
+            result[1] = {
+                "routes": FeatureIndex([ft for ft in features if ft["properties"]["type"] == "route"]),
+                "stops": FeatureIndex([ft for ft in features if ft["properties"]["type"] != "route"])
+            }
+    return result[1] if result is not None else None
+
+
+def stream_features(features):
+    """
+    Creates a response that sends features as newline delimited JSON while they are generated.
+    :param features: A generator of features.
+    :return: A StreamingResponse with one JSON encoded feature per line.
+    """
+    return StreamingResponse((dumps(ft) + b"\n" for ft in features), media_type="application/x-ndjson")
+
+
+@timed("ors_request")
 def ors_request(delv: List[Delivery], v: List[Vehicle], dep: List[Depot]):
     """
     Converts the three lists of models to ORS specific classes and optimizes routes using those.
@@ -75,8 +349,7 @@ def ors_request(delv: List[Delivery], v: List[Vehicle], dep: List[Depot]):
     :param dep: A list of depots that need to be modeled
     :return: An ORS optimization object containing the calculated optimized route.
     """
-    ors_client = openrouteservice.Client(
-        key=settings.ORS_API_KEY)  # Get an API key from https://openrouteservice.org/dev/#/signup
+    ors_client = get_gateway(settings.ORS_API_KEY)  # Get an API key from https://openrouteservice.org/dev/#/signup
     ors_jobs = []
     ors_vehicles = []
     for delivery in delv:
@@ -122,20 +395,19 @@ def get_ors_route(num, geometry, dur, dist):
         "duration_h": h,
         "duration_m": m,
         "cost": 0,
-        "idle_time": 0
+        "idle_time": 0,
+        "autonomous_segments": get_autonomous_segments(decoded["coordinates"])
     })
 
 
-def get_ors_delivery(num, delivery, history):
+def get_ors_delivery(num, delivery):
     """
-    Constructs the feature for the openrouteservice delivery object.
+    Constructs the feature for the openrouteservice delivery object, its single route is added once it is computed.
     :param num: The numeric identifier of the route.
     :param delivery: The delivery object to turn into a feature.
-    :param history: The past locations of this delivery.
     :return: A Feature object containing the GeoJSON for a delivery.
     """
     h, m = divmod(round(delivery['arrival'] / 60), 60)
-    dist, geom, segments = ors_directions(history)
     return Feature(geometry=Point((delivery['location'])), properties={
         "type": "delivery",
         "name": "Delivery",
@@ -150,15 +422,7 @@ def get_ors_delivery(num, delivery, history):
         "parcels": [delivery['job']],
         "toDepot": False,
         "arrival_mode": "Manual",
-        "single_route": Feature(geometry={"type": "LineString", "coordinates": geom}, properties={
-            "type": "single_route",
-            "name": "Route",
-            "number": delivery['job'],
-            "title": "Route for delivery "+str(delivery['job'],),
-            "distance": dist,
-            "duration_h": h,
-            "duration_m": m
-        })
+        "single_route": Feature()
     })
 
 
@@ -209,110 +473,240 @@ def make_ors_geojson(openrs, vs: List[Vehicle], deps: List[Depot]) -> FeatureCol
     :param vs: A list of vehicle models to include in the GeoJSON.
     :return: A FeatureCollection object containing the GeoJSON for the visualisation.
     """
+    return FeatureCollection(list(iter_ors_geojson(openrs, vs, deps)))
+
+
+@timed("make_ors_geojson")
+def iter_ors_geojson(openrs, vs: List[Vehicle], deps: List[Depot]):
+    """
+    Generates the features of make_ors_geojson, yielding the features of a route at a time, followed by the depots.
+    :param openrs: An ORS optimization object that has calculated routes.
+    :param deps: A list of depot models to include in the GeoJSON.
+    :param vs: A list of vehicle models to include in the GeoJSON.
+    :return: A generator of the Feature objects containing the GeoJSON for the visualisation.
+    """
     depot_routes = [[] for x in range(len(deps))]
     depot_parcels = [[] for x in range(len(deps))]
-    features = []
     enumerator = 1
     for route in openrs['routes']:
-        past_deliveries = []
-        features.append(get_ors_route(enumerator, route["geometry"], route["duration"], route["distance"]))
+        features = [get_ors_route(enumerator, route["geometry"], route["duration"], route["distance"])]
+        deliveries = []
+        jobs = []
         depot_routes[vs[route['vehicle'] - 1].depot - 1].append(enumerator)
         for delivery in route['steps']:
             if delivery['type'] == 'job':
-                past_deliveries.append(delivery['location'])
                 depot_parcels[vs[route['vehicle'] - 1].depot - 1].append(delivery["job"])
-                features.append(get_ors_delivery(enumerator, delivery, past_deliveries))
+                deliveries.append(get_ors_delivery(enumerator, delivery))
+                jobs.append(delivery)
+                features.append(deliveries[-1])
             elif delivery['type'] == 'start' or delivery['type'] == 'end':
-                past_deliveries.append(delivery['location'])
                 features.append(get_ors_start_stop(enumerator, delivery))
+        # The route of a delivery is the part of the route of the vehicle up to the delivery.
+        coordinates = features[0].geometry["coordinates"]
+        compute_single_routes(deliveries, [(job['distance'], coordinates[:index + 1], None)
+                                           for job, index in zip(jobs, locate_steps(coordinates, jobs))])
+        yield from features
         enumerator += 1
 
     for depot in deps:
-        features.append(get_ors_depot(depot, deps.index(depot), depot_routes[deps.index(depot)],
-                                      depot_parcels[deps.index(depot)]))
-    return FeatureCollection(features)
-
-
+        yield get_ors_depot(depot, deps.index(depot), depot_routes[deps.index(depot)], depot_parcels[deps.index(depot)])
+
+
+def locate_steps(coordinates, steps):
+    """
+    Finds the steps of a route on the geometry of the route. A step is matched to the coordinate closest to its
+    location among the coordinates that are about as far along the route as the step, and past the previous step.
+    :param coordinates: The coordinates of the geometry of the route.
+    :param steps: The steps of the route in order, with their location and the distance driven to reach them.
+    :return: The index of the coordinate of every step.
+    """
+    points = np.radians(np.asarray(coordinates, dtype=float))
+    d_lat = points[1:, 1] - points[:-1, 1]
+    d_lon = points[1:, 0] - points[:-1, 0]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(points[:-1, 1]) * np.cos(points[1:, 1]) * np.sin(d_lon / 2) ** 2
+    along = np.concatenate(([0.0], np.cumsum(2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a))))))
+    indices = []
+    first = 0
+    for step in steps:
+        location = np.radians(step['location'])
+        window = np.abs(along[first:] - step['distance']) <= max(100.0, 0.05 * step['distance'])
+        candidates = np.flatnonzero(window) + first if window.any() else np.arange(first, len(points))
+        # Squared distances in a local projection suffice to compare candidates that are close to each other.
+        offsets = (points[candidates] - location) * [np.cos(location[1]), 1.0]
+        first = int(candidates[np.argmin((offsets ** 2).sum(axis=1))])
+        indices.append(first)
+    return indices
+
+
+@timed("almende_request")
 def almende_request(scenario):
     """"
     Performs a request to the almende routing algorithm with the given input scenario file.
     :param scenario: An object containing the input variables that form the scenario.
-    :return: A JSON object with the by Almende calculated routes.
+    :return: An AlmendeOutput object with the by Almende calculated routes.
     """
     file_location = scenario.write_to_file()
     # TODO: make request to Almendes algorithm with the computed file location (or scenario object).
 
     # For now we shall use a sample json output file to return.
-    with open('./application/assets/delayed_output.json', 'r') as f:
-        data = json.load(f)
-    return data
+    with open('./application/assets/delayed_output.json', 'rb') as f:
+        return read_almende(f)
 
 
+@timed("ors_directions")
 def ors_directions(coordinate_list):
     """"
     Performs a request to ORS to compute the route coordinates between coordinates defined by the Almende algorithm.
+    If the local routing engine is configured, the route is computed in-process instead.
     :param coordinate_list: A list of coordinates between which to calculate a route.
     :return: The distance of the route, the coordinate information of the route, and the information of stopovers.
     """
+    key = directions_cache.key(settings.ROUTING_ENGINE + '/driving-car', coordinate_list)
+    cached = directions_cache.get(key)
+    count_cache("directions", cached is not None)
+    if cached is not None:
+        return cached
+
+    if settings.ROUTING_ENGINE == "local":
+        result = get_router(settings.ROUTING_GRAPH_PATH).directions(coordinate_list)
+        directions_cache.put(key, result)
+        return result
+
     if settings.ORS_URL != "":
-        ors_client = openrouteservice.Client(base_url=settings.ORS_URL)
+        ors_client = get_gateway(base_url=settings.ORS_URL)
     else:
-        ors_client = openrouteservice.Client(
-            key=settings.ORS_API_KEY)  # Get an API key from https://openrouteservice.org/dev/#/signup
+        ors_client = get_gateway(settings.ORS_API_KEY)  # Get an API key from https://openrouteservice.org/dev/#/signup
 
     ors_dirs = ors_client.directions(coordinate_list, profile='driving-car')
     geometry = openrouteservice.convert.decode_polyline(ors_dirs["routes"][0]["geometry"])["coordinates"]
-    return ors_dirs["routes"][0]["summary"]["distance"], geometry, ors_dirs["routes"][0]["segments"]
+    result = ors_dirs["routes"][0]["summary"]["distance"], geometry, ors_dirs["routes"][0]["segments"]
+    directions_cache.put(key, result)
+    return result
+
+
+def submit_directions(executor, pending, coordinate_lists):
+    """
+    Submits ORS directions requests to an executor, requesting identical coordinate lists only once.
+    :param executor: The executor that performs the requests.
+    :param pending: A dict of the requests submitted before, by coordinates, which is updated with the new requests.
+    :param coordinate_lists: A list of coordinate lists between which to calculate routes.
+    :return: A future of the result of ors_directions for every coordinate list, in the order of the given lists.
+    """
+    futures = []
+    for coordinate_list in coordinate_lists:
+        key = tuple(tuple(coordinates) for coordinates in coordinate_list)
+        if key not in pending:
+            pending[key] = executor.submit(ors_directions, coordinate_list)
+        futures.append(pending[key])
+    return futures
+
+
+def directions_batch(coordinate_lists):
+    """
+    Performs the ORS directions requests for many coordinate lists concurrently, requesting identical lists only once.
+    :param coordinate_lists: A list of coordinate lists between which to calculate routes.
+    :return: The result of ors_directions for every coordinate list, in the order of the given coordinate lists.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=settings.ORS_MAX_WORKERS) as executor:
+        return [future.result() for future in submit_directions(executor, {}, coordinate_lists)]
 
 
 def make_almende_geojson(almende_data):
     """
     Constructs JSON in the GeoJSON format according to the Almende algorithm using the given input scenario file.
-    :param almende_data: A JSON object containing the computed routes in Almendes output format.
+    :param almende_data: An AlmendeOutput object containing the computed routes.
     :return: A FeatureCollection object containing the GeoJSON for the visualisation.
     """
-    features = []
+    return FeatureCollection(list(iter_almende_geojson(almende_data)))
+
+
+@timed("make_almende_geojson")
+def iter_almende_geojson(almende_data):
+    """
+    Generates the features of make_almende_geojson, yielding the features of a vehicle as soon as its routes are
+    computed, followed by the depots.
+    :param almende_data: An AlmendeOutput object containing the computed routes.
+    :return: A generator of the Feature objects containing the GeoJSON for the visualisation.
+    """
     enumerator = 1
-    depots = get_depot_list(almende_data["nodes"])
+    lookup = make_lookup(almende_data)
+    depots = get_depot_list(almende_data.nodes)
     counter = 499
-    for vehicle in almende_data['vehicles']:
+    routes = []
+    for vehicle in almende_data.vehicles:
         coordinate_list, route_features, idle_time, counter, depots = iterate_actions(enumerator, depots, vehicle,
-                                                                                      almende_data, counter)
-        distance, geom, segments = ors_directions(coordinate_list)
-        geometry = {"type": "LineString", "coordinates": geom}
-        h, m = divmod(len(vehicle["actions"]), 60)
-        metrics = (almende_data["totalcost"]/len(almende_data["vehicles"]), round(distance, 1), idle_time, h, m,
-                   enumerator)
-        features += append_route(add_distances(route_features, segments), geometry, metrics)
+                                                                                      lookup, counter)
+        deliveries = [ft for ft in route_features if ft.properties["type"] == "delivery"]
+        routes.append((coordinate_list, route_features, idle_time, deliveries))
         enumerator += 1
-    features += depots
-    features = compute_single_routes(add_handovers_to_deliveries(features), almende_data["nodes"])
-    return FeatureCollection(features)
-
-
-def iterate_actions(enumerator, depots, vehicle, almende_data, counter):
+    handovers = index_handovers([ft for route in routes for ft in route[1]])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=settings.ORS_MAX_WORKERS) as executor:
+        # All routes and single delivery routes are requested at once, but every vehicle is handed out when it is
+        # complete.
+        pending = {}
+        futures = [submit_directions(executor, pending, [route[0]] +
+                                     [get_single_route_coords(ft, lookup) for ft in route[3]]) for route in routes]
+        enumerator = 1
+        for vehicle, route, route_futures in zip(almende_data.vehicles, routes, futures):
+            coordinate_list, route_features, idle_time, deliveries = route
+            directions = [future.result() for future in route_futures]
+            distance, geom, segments = directions[0]
+            geometry = {"type": "LineString", "coordinates": geom}
+            h, m = divmod(vehicle.actions.length, 60)
+            metrics = (almende_data.totalcost/len(almende_data.vehicles), round(distance, 1), idle_time, h, m,
+                       enumerator)
+            compute_single_routes(deliveries, directions[1:])
+            yield from add_handovers(append_route(add_distances(route_features, segments), geometry, metrics),
+                                     handovers)
+            enumerator += 1
+    yield from depots
+
+
+def make_lookup(almende_data):
+    """
+    Builds the lookup tables of an Almende result once, so that nodes and requests need not be scanned per action.
+    :param almende_data: An AlmendeOutput object containing the computed routes.
+    :return: An AlmendeLookup object mapping node ids to their coordinates and pickup flag, and request ids to their
+    origin and destination nodes.
+    """
+    locations = {}
+    pickups = {}
+    for node in almende_data.nodes:
+        locations.setdefault(node.id, (node.longitude, node.latitude))
+        pickups.setdefault(node.id, node.pickup)
+    origins = {}
+    destinations = {}
+    for req in almende_data.requests:
+        origins.setdefault(req.id, req.origin)
+        destinations.setdefault(req.id, req.destination)
+    return AlmendeLookup(locations, pickups, origins, destinations)
+
+
+def iterate_actions(enumerator, depots, vehicle, lookup, counter):
     """
     Iterates over the actions that a vehicle undertakes on its route and converts them to features for the GeoJSON.
     :param enumerator: A number that identifies the route/vehicle number.
     :param depots: A list of all depots available in the scenario.
     :param vehicle: The current vehicle object with actions to iterate over.
-    :param almende_data: The complete Almende algorithm output data.
+    :param lookup: The lookup tables of the complete Almende algorithm output data.
     :param counter: A number that serves as a unique key for handovers.
     :return: A list of coordinates, all actions translated to features, the total idle time, a handover key counter and
     an updated list of depots.
     """
-    ActionFactory = collections.namedtuple('ActionFactory', 'num action nodes vehicle minute requests location')
     idle_time = cur_action = 0
     prev_from = prev_to = delayed_prev_from = delayed_prev_to = -1
-    coordinate_list, route_features, past_waypoints = ([] for i in range(3))
-    route_features.append(get_start(almende_data["nodes"], vehicle, enumerator))
-    action_list = make_flat_action_list(vehicle["actions"])
+    coordinate_list, route_features = ([] for i in range(2))
+    past_waypoints = None
+    route_features.append(get_start(lookup, vehicle, enumerator))
+    timeline = make_timeline(vehicle)
+    action_list = timeline.actions
     for i in range(0, len(action_list)):
         action = action_list[i]
-        cur_action = ActionFactory(enumerator, action, almende_data["nodes"], vehicle, action["minute"], almende_data["requests"],
-                                   get_location(almende_data["nodes"], get_nearest_node(vehicle, action["minute"])))
+        cur_action = ActionFactory(enumerator, action, lookup, vehicle, timeline, action["minute"],
+                                   get_location(lookup.locations, get_nearest_node(timeline, action["minute"])))
         if action["actionType"] == "PICKUP":
-            depots[get_depot_index(depots, get_nearest_node(vehicle, i))].properties["route_numbers"].append(enumerator)
+            depots[get_depot_index(depots, get_nearest_node(timeline, i))].properties["route_numbers"].append(enumerator)
             route_features, past_waypoints = add_pickup(cur_action, route_features, past_waypoints)
         elif action["actionType"] == "HANDOVER":
             route_features, past_waypoints = add_handover(cur_action, counter, past_waypoints, route_features)
@@ -320,7 +714,7 @@ def iterate_actions(enumerator, depots, vehicle, almende_data, counter):
         elif action["actionType"] == "DELIVER":
             for delivery in action["relatedRequests"]:
                 route_features, past_waypoints = add_delivery(cur_action, delivery, past_waypoints, route_features,
-                                                              check_for_depot(almende_data["nodes"], get_nearest_node(vehicle, i)))
+                                                              check_for_depot(lookup.pickups, get_nearest_node(timeline, i)))
         elif action["actionType"] == "DELAYED" and (action["from"] != delayed_prev_from or action["to"] != delayed_prev_to):
             idle_time += action["duration"]
             route_features.append(get_delayed(cur_action))
@@ -333,15 +727,15 @@ def iterate_actions(enumerator, depots, vehicle, almende_data, counter):
                 idle_time += action["duration"]
                 route_features.append(get_delayed(cur_action))
             else:
-                coordinate_list = append_coords(coordinate_list, almende_data["nodes"], action["from"], action["to"])
+                coordinate_list = append_coords(coordinate_list, lookup.locations, action["from"], action["to"])
             prev_from = action["from"]
             prev_to = action["to"]
-    route_features.append(get_end(enumerator, cur_action.minute, almende_data["nodes"], vehicle))
+    route_features.append(get_end(enumerator, cur_action.minute, lookup, timeline))
     return coordinate_list, route_features, idle_time, counter, depots
 
 
-def get_end(num, minute, nodes, vehicle):
-    location = get_location(nodes, get_last_node(vehicle, minute))
+def get_end(num, minute, lookup, timeline):
+    location = get_location(lookup.locations, get_last_node(timeline, minute))
     h, m, n, a = get_init_values(minute, [])
     return Feature(geometry=Point(location), properties={
         "type": "end",
@@ -350,53 +744,44 @@ def get_end(num, minute, nodes, vehicle):
         "arrival_m": m,
         "distance": 0,
         "duration": 0,
-        "arrival_mode": get_prev_mode(vehicle, minute),
+        "arrival_mode": get_prev_mode(timeline, minute),
         "vehicle": num
     })
 
 
-def append_coords(list, nodes, from_c, to_c):
+def append_coords(list, locations, from_c, to_c):
     """
     Appends coordinates to the list of coordinates.
     :param list: The current list of coordinates.
-    :param nodes: All nodes in the scenario.
+    :param locations: The coordinates of all nodes in the scenario, by node id.
     :param from_c: The node number from which the route segment starts.
     :param to_c: The node number to which the route segment leads.
     :return: The updated list of coordinates.
     """
     if len(list) > 0:
         list.pop()
-    list.append(get_location(nodes, from_c))
-    list.append(get_location(nodes, to_c))
+    list.append(get_location(locations, from_c))
+    list.append(get_location(locations, to_c))
     return list
 
 
-def make_flat_action_list(actions):
-    """
-    Takes the list of actions and reduces it to a flat list.
-    :param actions: The list of actions.
-    :return: The flat list of actions.
-    """
-    res = []
-    for i in range(0, len(actions)):
-        res += make_list(actions, i)
-    return res
-
-
-def make_list(actions, i):
+def make_timeline(vehicle):
     """
-    Creates a list of the actions performed at a location in time, to provide support for the instances where multiple
-    actions are executed simultaneously.
-    :param actions: The list of actions of a route.
-    :param i: The minute for which to make a list of actions
-    :return: A list of one or more actions that occur at the given minute.
+    Indexes the actions of a vehicle in a single pass, so that the travelling moments around a minute can be found by
+    binary search instead of walking the actions minute by minute.
+    :param vehicle: The vehicle object of which to index the actions.
+    :return: A VehicleTimeline object containing the flat list of actions, and the sorted minutes at which the vehicle
+    is travelling together with the nodes it travels from and to and the mode it travels in at those minutes.
     """
-    action_list = actions[str(i)]
-    if type(action_list) != list:
-        action_list = [action_list]
-    for action in action_list:
-        action["minute"] = i
-    return action_list
+    actions = list(vehicle.actions.rows())
+    minutes, origins, targets, modes = ([] for i in range(4))
+    for action in actions:
+        if action["actionType"] == "TRAVELLING" and (len(minutes) == 0 or minutes[-1] != action["minute"]):
+            minutes.append(action["minute"])
+            origins.append(action["from"])
+            targets.append(action["to"])
+            modes.append(vehicle.modes.get(action["minute"]))
+    return VehicleTimeline(actions, minutes, origins, targets, modes)
 
 
 def append_route(features, geometry, metrics):
@@ -416,7 +801,8 @@ def append_route(features, geometry, metrics):
         "duration_h": metrics[3],
         "duration_m": metrics[4],
         "idle_time": metrics[2],
-        "cost": metrics[0]
+        "cost": metrics[0],
+        "autonomous_segments": get_autonomous_segments(geometry["coordinates"])
     }
     features.append(Feature(geometry=geometry, properties=properties))
     return features
@@ -428,34 +814,69 @@ def add_handovers_to_deliveries(features):
     :param features: A FeatureCollection containing all features of a route.
     :return: A FeatureCollection with updated delivery handover properties.
     """
-    handovers = [ft for ft in features if ft.properties["type"] == "handover"]
+    return add_handovers(features, index_handovers(features))
+
+
+def index_handovers(features):
+    """
+    Indexes the handover locations by the numbers involved in the handovers.
+    :param features: A FeatureCollection containing all features of a route.
+    :return: A dict with the list of handover geometries for every involved number.
+    """
+    handovers = collections.defaultdict(list)
     for ft in features:
-        if ft.properties["type"] == "delivery":
-            for ho in handovers:
-                if ft.properties["number"] in ho.properties["involved"]:
-                    ft.properties["handovers"].append(ho.geometry)
-    return features
+        if ft.properties["type"] == "handover":
+            for number in dict.fromkeys(ft.properties["involved"]):
+                handovers[number].append(ft.geometry)
+    return handovers
 
 
-def compute_single_routes(features, nodes):
+def add_handovers(features, handovers):
+    """
+    Adds the handover locations of a delivery to its handovers property.
+    :param features: A FeatureCollection containing features of a route.
+    :param handovers: The handover geometries indexed by involved number.
+    :return: A FeatureCollection with updated delivery handover properties.
+    """
     for ft in features:
-        if ft.properties["type"] == "delivery":
-            coordinate_list = [get_location(nodes, ft.properties["origin"])]
-            coordinate_list += ft.properties["waypoints"]
-            coordinate_list.append(ft.geometry["coordinates"])
-            dist, geom, seg = ors_directions(coordinate_list)
-            ft.properties["single_route"] = Feature(geometry={"type": "LineString", "coordinates": geom}, properties={
-                "type": "single_route",
-                "name": "Route",
-                "number": ft.properties["number"],
-                "title": "Route for delivery "+str(ft.properties["number"]),
-                "distance": dist,
-                "duration_h": ft.properties["arrival_h"],
-                "duration_m": ft.properties["arrival_m"]
-            })
+        if ft.properties["type"] == "delivery" and ft.properties["number"] in handovers:
+            ft.properties["handovers"] += handovers[ft.properties["number"]]
     return features
 
 
+def get_single_route_coords(delivery, lookup):
+    """
+    Creates the list of coordinates a delivery passes, from its origin depot along its waypoints to its destination.
+    :param delivery: The delivery feature.
+    :param lookup: The lookup tables of the Almende result.
+    :return: The list of coordinates of the route of the delivery.
+    """
+    coordinate_list = [get_location(lookup.locations, delivery.properties["origin"])]
+    coordinate_list += delivery.properties["waypoints"]
+    coordinate_list.append(delivery.geometry["coordinates"])
+    return coordinate_list
+
+
+def compute_single_routes(deliveries, directions):
+    """
+    Adds the route of every single delivery to its delivery feature.
+    :param deliveries: A list of delivery features.
+    :param directions: The ORS directions results of the routes of the deliveries, in the same order.
+    :return: The list of delivery features with their single routes.
+    """
+    for ft, (dist, geom, seg) in zip(deliveries, directions):
+        ft.properties["single_route"] = Feature(geometry={"type": "LineString", "coordinates": geom}, properties={
+            "type": "single_route",
+            "name": "Route",
+            "number": ft.properties["number"],
+            "title": "Route for delivery "+str(ft.properties["number"]),
+            "distance": dist,
+            "duration_h": ft.properties["arrival_h"],
+            "duration_m": ft.properties["arrival_m"]
+        })
+    return deliveries
+
+
 def add_distances(features, segments):
     """
     Adds the intermediate distance values to features.
@@ -485,9 +906,9 @@ def get_depot_list(nodes):
     res = []
     for point in nodes:
         # a node is a depot if its initial storage contains parcels.
-        init_storage = point["storage"]["0"]
+        init_storage = point.storage.get(0, [])
         if len(init_storage) > 0:
-            res.append(get_depot(point["coordinates"], point["id"], init_storage))
+            res.append(get_depot([point.longitude, point.latitude], point.id, init_storage))
     return res
 
 
@@ -499,7 +920,7 @@ def get_depot(coordinates, id, parcels):
     :param parcels: The list of parcels present at the depot.
     :return: A depot feature object.
     """
-    return Feature(geometry=Point(([coordinates["longitude"], coordinates["latitude"]])),
+    return Feature(geometry=Point(coordinates),
                    properties={
                        "type": "depot",
                        "name": "Depot",
@@ -510,17 +931,17 @@ def get_depot(coordinates, id, parcels):
                    })
 
 
-def get_start(nodes, vehicle, num):
+def get_start(lookup, vehicle, num):
     """
     Creates a start feature.
-    :param nodes: A list of available nodes in the route.
+    :param lookup: The lookup tables of the available nodes in the route.
     :param vehicle: The vehicle object of which to find the start.
     :param num: The identifier of the vehicle/route.
     :param load: The current load of the vehicle.
     :return: A start feature object.
     """
-    current_mode = vehicle["mode"]["0"]
-    start_loc = get_location(nodes, [vehicle["actions"]["0"]][0]["from"])
+    current_mode = vehicle.modes.get(0)
+    start_loc = get_location(lookup.locations, vehicle.actions.origins[0])
     feature = Feature(geometry=Point(start_loc), properties={
             "type": "start",
             "name": "Start",
@@ -540,8 +961,8 @@ def add_pickup(action, features, waypoints):
     Creates a pickup feature.
     :param action: All the information about the action object of the pickup.
     :param features: The list of features for the current route.
-    :param waypoints: The list of past waypoints.
-    :return: A pickup feature object.
+    :param waypoints: The history of past waypoints.
+    :return: The list of features and the history of waypoints, both appended with a pickup feature object.
     """
     h, m, parcels, parcel_str = get_init_values(action.minute, action.action["relatedRequests"])
     feature = Feature(geometry=Point(action.location),
@@ -556,11 +977,10 @@ def add_pickup(action, features, waypoints):
                     "duration": action.action["duration"],
                     "distance": 0,
                     "vehicle": action.num,
-                    "arrival_mode": get_prev_mode(action.vehicle, action.minute)
+                    "arrival_mode": get_prev_mode(action.timeline, action.minute)
                 })
     features.append(feature)
-    waypoints.append(feature)
-    return features, waypoints
+    return features, Waypoint(feature, waypoints)
 
 
 def add_handover(action, counter, waypoints, features):
@@ -568,9 +988,9 @@ def add_handover(action, counter, waypoints, features):
     Creates a handover feature.
     :param action: All the information about the action object of the handover.
     :param counter: The identifier of the handover.
-    :param waypoints: The past locations of the handover.
+    :param waypoints: The history of past waypoints.
     :param features: The list of features of the current route.
-    :return: A handover feature object.
+    :return: The list of features and the history of waypoints, both appended with a handover feature object.
     """
     h, m, parcels, parcel_str = get_init_values(action.minute, action.action["relatedRequests"])
     feature = Feature(geometry=Point(action.location),
@@ -586,32 +1006,29 @@ def add_handover(action, counter, waypoints, features):
                     "duration": action.action["duration"],
                     "distance": 0,
                     "vehicle": action.num,
-                    "waypoints": copy.deepcopy(waypoints),
                     "involved": [action.num],
                     "parcels": [],
-                    "arrival_mode": get_prev_mode(action.vehicle, action.minute)
+                    "arrival_mode": get_prev_mode(action.timeline, action.minute)
                 })
     features.append(feature)
-    waypoints.append(feature)
-    return features, waypoints
+    return features, Waypoint(feature, waypoints)
 
 
 def get_delivery_waypoints(waypoints, delivery):
     """
-    Creates a list of points where this delivery has been, following past deliveries, handovers and pickups.
-    :param waypoints: The past actions for the current vehicle.
+    Creates a list of points where this delivery has been, following past deliveries, handovers and pickups back to
+    the pickup of the delivery. The history of waypoints is shared between features and is only read.
+    :param waypoints: The history of past actions for the current vehicle, most recent first.
     :param delivery: The delivery to track points for.
-    :return: A list of coordinates of points the delivery has been past.
+    :return: A list of coordinates of points the delivery has been past, most recent first.
     """
     res = []
-    for point in waypoints:
+    while waypoints is not None:
+        point = waypoints.feature
         res.append(point.geometry["coordinates"])
-        if point.properties["type"] == "handover" and delivery in point.properties["parcels"]:
-            new_wp = point.properties["waypoints"]
-            new_wp.reverse()
-            return res + get_delivery_waypoints(new_wp, delivery)
-        elif point.properties["type"] == "pickup" and delivery in point.properties["parcels"]:
+        if point.properties["type"] == "pickup" and delivery in point.properties["parcels"]:
             return res
+        waypoints = waypoints.previous
     return res
 
 
@@ -620,17 +1037,15 @@ def add_delivery(action, delivery, waypoints, features, to_depot):
     Creates a delivery feature.
     :param action: All the information about the action object of the delivery.
     :param delivery: The identifier of the current delivery.
-    :param waypoints: The list of all past locations of this delivery.
+    :param waypoints: The history of all past locations of this delivery.
     :param features: The list of features for the current route.
     :param to_depot: A boolean that determines if a delivery is done at a depot or not.
-    :return: A delivery feature object.
+    :return: The list of features and the history of waypoints, both appended with a delivery feature object.
     """
-    wp_modified = copy.deepcopy(waypoints)
-    wp_modified.reverse()
-    wp = get_delivery_waypoints(wp_modified, delivery)
+    wp = get_delivery_waypoints(waypoints, delivery)
     wp.reverse()
     h, m = divmod(action.minute, 60)
-    loc = get_location(action.nodes, get_nearest_node(action.vehicle, action.minute))
+    loc = get_location(action.lookup.locations, get_nearest_node(action.timeline, action.minute))
     feature = Feature(geometry=Point(loc),
                 properties={
                     "type": "delivery",
@@ -643,17 +1058,16 @@ def add_delivery(action, delivery, waypoints, features, to_depot):
                     "duration": action.action["duration"],
                     "distance": 0,
                     "vehicle": action.num,
-                    "origin": get_origin_depot(action.requests, delivery),
+                    "origin": get_origin_depot(action.lookup.origins, delivery),
                     "handovers": [],
                     "parcels": [],
                     "waypoints": wp,
                     "to_depot": to_depot,
                     "single_route": Feature(),
-                    "arrival_mode": get_prev_mode(action.vehicle, action.minute)
+                    "arrival_mode": get_prev_mode(action.timeline, action.minute)
                 })
     features.append(feature)
-    waypoints.append(feature)
-    return features, waypoints
+    return features, Waypoint(feature, waypoints)
 
 
 def get_init_values(minute, related_req):
@@ -674,19 +1088,19 @@ def get_mode_change(action):
     :return: A mode_change feature object.
     """
     h, m = divmod(action.minute, 60)
-    loc = get_location(action.nodes, get_nearest_node(action.vehicle, action.minute))
+    loc = get_location(action.lookup.locations, get_nearest_node(action.timeline, action.minute))
     feature = Feature(geometry=Point(loc),
                 properties={
                     "type": "mode_change",
                     "name": "Mode change",
-                    "title": "Change from " + action.vehicle["mode"][str(action.minute)] + " to " + get_next_mode(action.vehicle, action.minute),
+                    "title": "Change from " + action.vehicle.modes.get(action.minute) + " to " + get_next_mode(action.timeline, action.minute),
                     "route_number": action.num,
                     "arrival_h": h,
                     "arrival_m": m,
                     "duration": action.action["duration"],
                     "distance": 0,
                     "vehicle": action.num,
-                    "arrival_mode": get_prev_mode(action.vehicle, action.minute)
+                    "arrival_mode": get_prev_mode(action.timeline, action.minute)
                 })
     return feature
 
@@ -698,7 +1112,7 @@ def get_delayed(action):
     :return: A delay feature object.
     """
     h, m = divmod(action.minute, 60)
-    loc = get_location(action.nodes, get_nearest_node(action.vehicle, action.minute))
+    loc = get_location(action.lookup.locations, get_nearest_node(action.timeline, action.minute))
     feature = Feature(geometry=Point(loc),
                       properties={
                           "type": "delayed",
@@ -710,7 +1124,7 @@ def get_delayed(action):
                           "distance": 0,
                           "vehicle": action.num,
                           "duration": action.action["duration"],
-                          "arrival_mode": get_prev_mode(action.vehicle, action.minute)
+                          "arrival_mode": get_prev_mode(action.timeline, action.minute)
                       })
     return feature
 
@@ -742,95 +1156,107 @@ def remove(parcels, load):
     return res
 
 
-def get_location(nodes, id):
+def get_location(locations, id):
     """
     Retrieve the coordinates of a node.
-    :param nodes: The list of nodes.
+    :param locations: The coordinates of all nodes, by node id.
     :param id: The id of the node for which to find the location.
     :return: The coordinate values of the given node.
     """
-    for node in nodes:
-        if node["id"] == id:
-            return node["coordinates"]["longitude"], node["coordinates"]["latitude"]
-    return -1
+    return locations.get(id, -1)
+
+
+def get_prev_travel(timeline, minute):
+    """
+    Find the last moment at or before a minute at which a vehicle is travelling.
+    :param timeline: The timeline of the vehicle.
+    :param minute: The minute from which to look back.
+    :return: The index of that moment in the timeline, or -1 if the vehicle has not travelled since minute 0.
+    """
+    index = bisect.bisect_right(timeline.minutes, minute) - 1
+    if index < 0 or timeline.minutes[index] < 1:
+        return -1
+    return index
+
+
+def get_next_travel(timeline, minute):
+    """
+    Find the first moment at or after a minute at which a vehicle is travelling.
+    :param timeline: The timeline of the vehicle.
+    :param minute: The minute from which to look ahead.
+    :return: The index of that moment in the timeline, or -1 if the vehicle does not travel anymore.
+    """
+    index = bisect.bisect_left(timeline.minutes, minute)
+    if index >= len(timeline.minutes):
+        return -1
+    return index
 
 
-def get_prev_mode(vehicle, minute):
+def get_prev_mode(timeline, minute):
     """
     Retrieve the mode with which a vehicle arrives at a location.
-    :param vehicle: The vehicle for which to find the mode.
+    :param timeline: The timeline of the vehicle for which to find the mode.
     :param minute: The moment the mode change occurs.
     :return: The mode (Autonomous vs Manual) that the vehicle will take on.
     """
-    for i in range(minute, 0, -1):
-        for action in make_list(vehicle["actions"], i):
-            if action["actionType"] == "TRAVELLING":
-                return vehicle["mode"][str(i)]
+    index = get_prev_travel(timeline, minute)
+    if index >= 0:
+        return timeline.modes[index]
 
 
-def get_next_mode(vehicle, minute):
+def get_next_mode(timeline, minute):
     """
     Retrieve the mode with which a vehicle departs from a mode change feature.
-    :param vehicle: The vehicle for which to find the mode.
+    :param timeline: The timeline of the vehicle for which to find the mode.
     :param minute: The moment the mode change occurs.
     :return: The mode (Autonomous vs Manual) that the vehicle will take on.
     """
-    for i in range(minute, len(vehicle["actions"])):
-        for action in make_list(vehicle["actions"], i):
-            if action["actionType"] == "TRAVELLING":
-                return vehicle["mode"][str(i)]
+    index = get_next_travel(timeline, minute)
+    if index >= 0:
+        return timeline.modes[index]
 
 
-def get_last_node(vehicle, minute):
-    for i in range(minute, 0, -1):
-        for action in make_list(vehicle["actions"], i):
-            if action["actionType"] == "TRAVELLING":
-                return action["to"]
+def get_last_node(timeline, minute):
+    index = get_prev_travel(timeline, minute)
+    if index >= 0:
+        return timeline.targets[index]
 
 
-def get_nearest_node(vehicle, minute):
+def get_nearest_node(timeline, minute):
     """
     Retrieve the node at which a current event takes place.
-    :param vehicle: The vehicle for which to find the mode.
-    :param minute: The moment the mode change occurs.
-    :return: The mode (Autonomous vs Manual) that the vehicle will take on.
+    :param timeline: The timeline of the vehicle for which to find the node.
+    :param minute: The moment the event occurs.
+    :return: The node the vehicle departs from next, or else the node it arrived at last.
     """
-    for i in range(minute, len(vehicle["actions"])):
-        for action in make_list(vehicle["actions"], i):
-            if action["actionType"] == "TRAVELLING":
-                return action["from"]
-    for i in range(minute, 0, -1):
-        for action in make_list(vehicle["actions"], i):
-            if action["actionType"] == "TRAVELLING":
-                return action["to"]
+    index = get_next_travel(timeline, minute)
+    if index >= 0:
+        return timeline.origins[index]
+    index = get_prev_travel(timeline, minute)
+    if index >= 0:
+        return timeline.targets[index]
 
 
-def get_req_dest(requests, nodes, dlv):
+def get_req_dest(lookup, dlv):
     """
     Retrieve the location of a delivery.
-    :param requests: The list of all requests.
-    :param nodes: The list of all nodes.
+    :param lookup: The lookup tables of all requests and nodes.
     :param dlv: identifier of the request.
     :return: The coordinates of the delivery.
     """
-    for req in requests:
-        if req["id"] == dlv:
-            return get_location(nodes, req["destination"])
+    if dlv in lookup.destinations:
+        return get_location(lookup.locations, lookup.destinations[dlv])
 
 
-def get_origin_depot(requests, dlv):
+def get_origin_depot(origins, dlv):
     """
     Retrieve the depot node where a parcel is initially.
-    :param requests: The list of all requests.
+    :param origins: The origin node ids of all requests, by request id.
     :param dlv: identifier of the request.
     :return: The node id of the origin depot.
     """
-    for req in requests:
-        if req["id"] == dlv:
-            return req["origin"]
+    return origins.get(dlv)
 
 
-def check_for_depot(nodes, loc):
-    for node in nodes:
-        if node["id"] == loc:
-            return node["pickup"] == 1
+def check_for_depot(pickups, loc):
+    return pickups.get(loc)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from starlette.responses import Response
+
+from application.services import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Returns the metrics of the backend for Prometheus, such as the duration of the stages of computing routes, the
+    requests to external services, the hit rates of the caches and the requests in flight.
+    :return: The metrics in the Prometheus text format.
+    """
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
@@ -3,144 +3,333 @@ import pandas as pd
 import osmnx as ox
 import numpy as np
 import concurrent.futures
+import os
 from global_land_mask import globe
-import threading
 import requests
 import json
-from itertools import repeat
+import time
+import itertools
 from typing import List
+from openrouteservice import exceptions
 
+from application.config import Settings
 from application.models.Delivery import Delivery
 from application.models.OrderFactory import OrderFactory
-from application.routes import map as mp
-from application.dependencies.data_dependencies import load_vehicles, load_depots
+from application.dependencies.data_dependencies import load_depots
+from application.services.metrics import timed, observe_external
+from application.services.ors_gateway import get_gateway
+from application.services.road_router import get_router
+from application.services.road_snapper import get_snapper
 
 router = APIRouter()
 
+settings = Settings(_env_file='./application/.env')
+
+# All orders are generated in this executor, and share the keep-alive connections of the session to OSRM.
+order_executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.ORDER_MAX_WORKERS,
+                                                       thread_name_prefix="orders")
+osrm_session = requests.Session()
+osrm_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1,
+                                                            pool_maxsize=settings.ORDER_MAX_WORKERS))
+
+# Metres per degree of latitude, and of longitude at the equator.
+METRES_LAT = 110540.0
+METRES_LON = 111320.0
+# The number of random coordinates tried for an order before giving up.
+ORDER_ATTEMPTS = 5
+
 
 @router.post("/randomize", response_model=List[Delivery])
-def get_random_orders(orders: int, depot_radius: int):
+@timed("generate_orders")
+def get_random_orders(orders: int, depot_radius: int, seed: int = None):
     """
     Randomly generates new deliveries using the specified parameters.
     :param orders: The amount of orders that need to be generated.
     :param depot_radius: The radius of the area around a depot that each delivery should be in.
+    :param seed: An optional seed to generate the same orders again, as far as the nearest roads stay the same.
     :return: The list of generated deliveries.
     """
     depot_data = load_depots('./application/assets/depots.csv')
-    vehicles = load_vehicles('./application/assets/vehicles.csv')
+    order_factory = make_order_factory(depot_data, depot_radius, orders)
 
     # Delivery points can be generated too far from road segments, this will cause ORS to
-    # throw an error. To prevent this from happening in the frontend, testruns are performed here.
-    its = 0
-    while True and its < 20:
-        generated_orders = generator(depot_data, depot_radius, orders)
-
-        try:
-            res = mp.get_geojson(algorithm=0, deliveries=generated_orders, vehicles=vehicles)
-            print(res)
-            return generated_orders
-        except Exception as e:
-            print(e)
-            its += 1
+    # throw an error. To prevent this from happening in the frontend, the points are validated here, and only the
+    # rejected points are generated again. The orders of every depot are validated as soon as they are generated.
+    orders_by_id = {}
+    batches = stream_orders(depot_jobs(depot_data, order_factory, None if seed is None else [seed, 0]), depot_radius)
+    for its in range(1, 21):
+        rejected = []
+        unchecked = []
+        for batch in batches:
+            orders_by_id.update((delivery.id, delivery) for delivery in batch)
+            try:
+                rejected += validate_orders(batch, depot_data)
+            except Exception as e:
+                print(e)
+                unchecked += batch
+        if not rejected and not unchecked:
+            return sorted(orders_by_id.values(), key=lambda delivery: delivery.id)
+        print(str(len(rejected)) + " generated orders rejected")
+        regenerated = regenerate_orders(rejected, depot_data, order_factory, None if seed is None else [seed, its])
+        batches = itertools.chain([unchecked] if unchecked else [], regenerated)
 
     raise HTTPException(status_code=508, detail="Order generation fails continuously.")
 
 
-def random_coordinates(coordinates, depot_radius):
+def validate_orders(deliveries, depot_data):
+    """
+    Checks in bulk whether deliveries can be driven to and from the depots. The road graph at ROUTING_GRAPH_PATH is
+    used if it exists, ORS matrices otherwise.
+    :param deliveries: The list of deliveries to check.
+    :param depot_data: The list of depots.
+    :return: The list of the deliveries that are rejected.
+    """
+    if not deliveries:
+        return []
+    if os.path.exists(settings.ROUTING_GRAPH_PATH):
+        return validate_local(deliveries, depot_data)
+    per_matrix = max(1, settings.ORS_MATRIX_SIZE // len(depot_data))
+    client = get_gateway(settings.ORS_API_KEY)
+    rejected = []
+    for first in range(0, len(deliveries), per_matrix):
+        rejected += validate_ors(client, deliveries[first:first + per_matrix], depot_data)
+    return rejected
+
+
+def validate_local(deliveries, depot_data):
+    """
+    Rejects the deliveries that are further than ORDER_SNAP_DISTANCE from a road of the road graph, or of which the
+    nearest road is not connected with a depot in both directions.
+    :return: The list of the deliveries that are rejected.
+    """
+    road_router = get_router(settings.ROUTING_GRAPH_PATH)
+    snapper = get_snapper(settings.ROUTING_GRAPH_PATH)
+    depot_components = {road_router.component(road_router.nearest_node([dep.longitude, dep.latitude]))
+                        for dep in depot_data}
+    snapped, distances = snapper.snap([[delivery.latitude, delivery.longitude] for delivery in deliveries])
+    return [delivery for delivery, distance in zip(deliveries, distances)
+            if distance > settings.ORDER_SNAP_DISTANCE or road_router.component(
+                road_router.nearest_node([delivery.longitude, delivery.latitude])) not in depot_components]
+
+
+def validate_ors(client, deliveries, depot_data):
+    """
+    Rejects the deliveries that ORS cannot route to from any depot, using a single distance matrix from the depots
+    to the deliveries. ORS fails the whole matrix if it cannot find a road near a point, in which case the deliveries
+    are split in halves to find the points at fault.
+    :param client: The ORS client.
+    :return: The list of the deliveries that are rejected.
+    """
+    locations = [[dep.longitude, dep.latitude] for dep in depot_data] + \
+                [[delivery.longitude, delivery.latitude] for delivery in deliveries]
+    try:
+        matrix = client.distance_matrix(locations, profile='driving-car', metrics=['distance'],
+                                        sources=list(range(len(depot_data))),
+                                        destinations=list(range(len(depot_data), len(locations))))
+    except exceptions.ApiError as e:
+        if e.status != 404:
+            raise
+        if len(deliveries) == 1:
+            return deliveries
+        half = len(deliveries) // 2
+        return validate_ors(client, deliveries[:half], depot_data) + \
+            validate_ors(client, deliveries[half:], depot_data)
+    return [delivery for i, delivery in enumerate(deliveries)
+            if all(row[i] is None for row in matrix['distances'])]
+
+
+def regenerate_orders(rejected, depot_data, order_factory, seed=None):
+    """
+    Generates new delivery points in place of rejected ones, around the same depots and with the same identifiers.
+    :param rejected: The list of rejected deliveries.
+    :param depot_data: The list of depots.
+    :param order_factory: The OrderFactory the orders were generated with.
+    :param seed: An optional seed that makes the random coordinates reproducible.
+    :return: An iterator over the lists of new deliveries per depot, see stream_orders.
+    """
+    indices_by_depot = {}
+    for delivery in rejected:
+        indices_by_depot.setdefault(order_depot(order_factory, delivery.id - 1), []).append(delivery.id - 1)
+    seeds = np.random.SeedSequence(seed).spawn(len(depot_data))
+    return stream_orders([(dep, indices_by_depot.get(dep.id, []), dep_seed)
+                          for dep, dep_seed in zip(depot_data, seeds)], order_factory.depot_radius)
+
+
+def make_order_factory(depot_data, depot_radius, order_number):
+    return OrderFactory.make(int(order_number/len(depot_data)), len(depot_data), order_number, depot_radius)
+
+
+def order_depot(order_factory, index):
     """
-    Make a list of random coordinates on land within certain bounds.
-    :param coordinates: The coordinates of the center depot.
-    :param depot_radius: The radius around the depot that sets the bounds of the random coordinates.
-    :return: A list of random coordinates within certain bounds around a depot.
+    :param order_factory: The OrderFactory the orders were generated with.
+    :param index: The index of an order, which is its identifier minus one.
+    :return: The identifier of the depot the order was generated around.
     """
-    iterations = 0
-    while iterations < 50:
-        # By dividing the depot radius by constant 120000, the depot radius will be roughly maintained in coordinate
-        # generation. This constant is valid in The Netherlands. In other regions in the world, especially with very
-        # diverging latitude coordinates, the constant needs to be recalculated.
-        radius_degree = depot_radius / 120000
-        temp_lat = round(np.random.uniform(coordinates[0] - radius_degree, coordinates[0] + radius_degree), 7)
-        temp_lon = round(np.random.uniform(coordinates[1] - radius_degree, coordinates[1] + radius_degree), 7)
+    if order_factory.orders_per_depot == 0:
+        return order_factory.depot_number
+    return min(index // order_factory.orders_per_depot, order_factory.depot_number - 1) + 1
 
-        # Only return point if it is on land, otherwise try again.
-        if globe.is_land(temp_lat, temp_lon):
-            return temp_lat, temp_lon
-        else:
-            iterations += 1
-    return coordinates[0], coordinates[1]
 
+def sample_coordinates(coordinates, depot_radius, count, rng):
+    """
+    Draws random coordinates on land, spread evenly over a disk around a depot. Points are drawn and checked for land
+    in whole batches, and the points in water are replaced by drawing another batch.
+    :param coordinates: The latitude and longitude of the center depot.
+    :param depot_radius: The radius of the disk in metres.
+    :param count: The number of coordinates to draw.
+    :param rng: The numpy random Generator to draw with.
+    :return: An array of count latitude, longitude pairs, in which points that could not be found on land after
+    several batches are the coordinates of the depot.
+    """
+    lat, lon = coordinates
+    res = np.empty((0, 2))
+    batches = 0
+    while len(res) < count and batches < 50:
+        needed = count - len(res)
+        batch = max(2 * needed, 64)
+        # The square root makes the points uniform over the area of the disk instead of crowding the center.
+        distance = depot_radius * np.sqrt(rng.random(batch))
+        bearing = rng.uniform(0, 2 * np.pi, batch)
+        lats = lat + distance * np.cos(bearing) / METRES_LAT
+        lons = lon + distance * np.sin(bearing) / (METRES_LON * np.cos(np.radians(lat)))
+        land = globe.is_land(lats, lons)
+        res = np.concatenate((res, np.column_stack((lats[land], lons[land]))[:needed]))
+        batches += 1
+    if len(res) < count:
+        res = np.concatenate((res, np.tile([lat, lon], (count - len(res), 1))))
+    return np.round(res, 7)
 
-def get_single_order(index, coordinates, rad):
+
+def get_single_order(index, candidates):
     """
     Get the nearest road to a pair of coordinates to use as delivery point.
     :param index: The identifier of a delivery.
-    :param coordinates: The coordinates of the center depot.
-    :param rad: The radius around the depot in which to generate orders.
+    :param candidates: The random coordinates to try in order, until one of them is near a road.
     :return: A delivery point object.
     """
-    thread_local = threading.local()
-    if not hasattr(thread_local, 'session'):
-        thread_local.session = requests.Session()
-    session = thread_local.session
-    iterations = 0
-
-    while iterations < 50:
-        lat, lon = random_coordinates(coordinates, rad)
+    for lat, lon in candidates:
         urli = "http://router.project-osrm.org/nearest/v1/car/" + str(lon) + "," + str(lat)
         print(urli)
 
+        start = time.perf_counter()
         try:
-            with session.get(urli) as response:
+            with osrm_session.get(urli, timeout=settings.ORDER_TIMEOUT) as response:
+                observe_external("osrm", "/nearest/v1/car", time.perf_counter() - start, response.status_code != 200)
                 string = response.content.decode('utf-8')
                 data = json.loads(string)
                 return Delivery.from_raw_data(index+1, data['waypoints'][0]['location'][1],
                                               data['waypoints'][0]['location'][0], 1)
         except Exception as e:
             print(e)
-            iterations += 1
     return Delivery.from_raw_data(index+1, 90, 180, 1)
 
 
-def order_method(dep, order_factory):
+def snap_orders(indices, candidates):
     """
-    Generate orders around a single depot according to random point generation with validation.
+    Snaps the random coordinates of many orders to the nearest roads of the road graph at once.
+    :param indices: The identifiers of the deliveries, minus one.
+    :param candidates: An array with for every order the random coordinates to try in order.
+    :return: A list of delivery point objects, each at the first candidate within ORDER_SNAP_DISTANCE of a road, or
+    at the candidate nearest to a road if there is none.
+    """
+    order_count, attempts = candidates.shape[:2]
+    snapped, distances = get_snapper(settings.ROUTING_GRAPH_PATH).snap(candidates.reshape(-1, 2))
+    snapped, distances = snapped.reshape(order_count, attempts, 2), distances.reshape(order_count, attempts)
+    near = distances <= settings.ORDER_SNAP_DISTANCE
+    chosen = np.where(near.any(axis=1), near.argmax(axis=1), distances.argmin(axis=1))
+    return [Delivery.from_raw_data(index + 1, lat, lon, 1)
+            for index, (lat, lon) in zip(indices, snapped[np.arange(order_count), chosen].round(7).tolist())]
+
+
+def get_orders(indices, candidates):
+    """
+    Gets delivery points near the roads with OSRM, one order after the other.
+    :param indices: The identifiers of the deliveries, minus one.
+    :param candidates: An array with for every order the random coordinates to try in order.
+    :return: A list of delivery point objects.
+    """
+    return [get_single_order(index, order_candidates) for index, order_candidates in zip(indices, candidates)]
+
+
+def submit_orders(dep, indices, depot_radius, seed):
+    """
+    Starts generating delivery points on the roads around a depot in the shared executor. The points are snapped in a
+    single task if there is a road graph, and by a task per order with OSRM otherwise.
     :param dep: The depot around which to generate orders.
-    :param order_factory: An object containing the information needed to generate orders  around a depot
-    :return: A list of random delivery points around a single given depot.
+    :param indices: The identifiers of the deliveries, minus one.
+    :param depot_radius: The radius around the depot in metres.
+    :param seed: The numpy SeedSequence of the random coordinates.
+    :return: A list of futures of lists of delivery points.
     """
-    res_list = []
+    candidates = sample_coordinates((dep.latitude, dep.longitude), depot_radius, len(indices) * ORDER_ATTEMPTS,
+                                    np.random.default_rng(seed)).reshape(len(indices), ORDER_ATTEMPTS, 2)
+    if os.path.exists(settings.ROUTING_GRAPH_PATH):
+        return [order_executor.submit(snap_orders, indices, candidates)]
+    return [order_executor.submit(get_orders, [index], candidates[i:i + 1]) for i, index in enumerate(indices)]
+
 
+def stream_orders(jobs, depot_radius):
+    """
+    Generates orders around depots, all in the executor shared by the process so that the number of requests to OSRM
+    in flight is bounded for all requests together.
+    :param jobs: A list of tuples of a depot, the identifiers minus one of the deliveries to generate around it and the
+    numpy SeedSequence of their random coordinates.
+    :param depot_radius: The radius around the depots in metres.
+    :return: An iterator over the lists of delivery points per depot, in the order in which the depots are finished.
+    """
+    depots = {}
+    remaining = {}
+    results = {}
+    for dep, indices, seed in jobs:
+        if len(indices) > 0:
+            futures = submit_orders(dep, indices, depot_radius, seed)
+            depots.update((future, dep.id) for future in futures)
+            remaining[dep.id] = len(futures)
+            results[dep.id] = []
+    try:
+        for future in concurrent.futures.as_completed(depots):
+            dep_id = depots[future]
+            results[dep_id] += future.result()
+            remaining[dep_id] -= 1
+            if remaining[dep_id] == 0:
+                yield sorted(results.pop(dep_id), key=lambda delivery: delivery.id)
+    finally:
+        for future in depots:
+            future.cancel()
+
+
+def depot_indices(dep, order_factory):
+    """
+    :param dep: A depot.
+    :param order_factory: An object containing the information needed to generate orders around a depot.
+    :return: The identifiers minus one of the orders generated around the depot.
+    """
     if dep.id == order_factory.depot_number:
         order_count = order_factory.order_number - ((dep.id - 1) * order_factory.orders_per_depot)
     else:
         order_count = order_factory.orders_per_depot
     oinit = (dep.id - 1) * order_factory.orders_per_depot
+    return list(range(oinit, oinit+order_count))
 
-    with concurrent.futures.ThreadPoolExecutor() as threader:
-        temp_results = threader.map(get_single_order, range(oinit, oinit+order_count),
-                                    repeat((dep.latitude, dep.longitude)), repeat(order_factory.depot_radius))
 
-        for res_tuple in temp_results:
-            res_list.append(res_tuple)
-
-    return res_list
+def depot_jobs(depot_data, order_factory, seed=None):
+    """
+    :return: The jobs of stream_orders that generate all orders of an OrderFactory.
+    """
+    return [(dep, depot_indices(dep, order_factory), dep_seed)
+            for dep, dep_seed in zip(depot_data, np.random.SeedSequence(seed).spawn(len(depot_data)))]
 
 
-def generator(depot_data, depot_radius, order_number):
+def generator(depot_data, depot_radius, order_number, seed=None):
     """
     Generates a possible list of random delivery points.
     :param depot_data: A list of depot points to generate orders around.
-    :param depot_radius: An integer indicating the radius around which to generate orders in km.
+    :param depot_radius: An integer indicating the radius around which to generate orders in metres.
     :param order_number: The total number of orders to generate.
+    :param seed: An optional seed that makes the random coordinates reproducible.
     :return: A list of random orders around the given depots.
     """
-    res_orders = []
-    order_factory = OrderFactory.make(int(order_number/len(depot_data)), len(depot_data), order_number, depot_radius)
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        results = executor.map(order_method, depot_data, repeat(order_factory))
-
-        for res in results:
-            res_orders += res
-
-    return res_orders
+    order_factory = make_order_factory(depot_data, depot_radius, order_number)
+    res_orders = itertools.chain.from_iterable(stream_orders(depot_jobs(depot_data, order_factory, seed),
+                                                             depot_radius))
+    return sorted(res_orders, key=lambda delivery: delivery.id)
@@ -5,6 +5,7 @@ from application.models.Algorithm import Algorithm, AlgorithmInput, AlgorithmVar
 from application.models.Scenario import Scenario
 
 from application.dependencies.data_dependencies import load_deliveries, load_depots, load_vehicles
+from application.services.asset_store import assets
 
 router = APIRouter()
 
@@ -20,7 +21,7 @@ def get_input():
         "vehicles": load_vehicles('./application/assets/vehicles.csv'),
         "depots": load_depots('./application/assets/depots.csv'),
         "deliveries": load_deliveries('./application/assets/deliveries.csv'),
-        "scenario": Scenario.read_from_file('./application/assets/sample_scenario.txt')
+        "scenario": assets.get('./application/assets/sample_scenario.txt', Scenario.read_from_file)
     }
     return obj
 
@@ -37,11 +38,20 @@ def set_algorithm(alg: AlgorithmDefaultInput):
 def load_algorithms():
     """"
     Loads the algorithms data.
-    :return: List of available algorithms
+    :return: Tuple of available algorithms, which must not be modified.
+    """
+    return assets.get('./application/assets/algorithms.csv', read_algorithms)
+
+
+def read_algorithms(file_path: str):
+    """
+    Parses the csv file to a list of algorithm models.
+    :param file_path: the path to the csv file to be parsed.
+    :return: List of algorithms.
     """
     algorithms = []
     raw_algs = pd.read_csv(
-        './application/assets/algorithms.csv'
+        file_path
     )
     for raw_algorithm in raw_algs.itertuples():
         algorithms.append(Algorithm.from_csv_tuple(raw_algorithm))
@@ -51,10 +61,19 @@ def load_algorithms():
 def load_input_vars():
     """"
     Loads the data that is used for order generation.
-    :return: List of randomizer input variables
+    :return: Tuple of randomizer input variables, which must not be modified.
+    """
+    return assets.get('./application/assets/input_variables.csv', read_input_vars)
+
+
+def read_input_vars(file_path: str):
+    """
+    Parses the csv file to a list of randomizer input variables.
+    :param file_path: the path to the csv file to be parsed.
+    :return: List of randomizer input variables.
     """
     input_vars = pd.read_csv(
-        './application/assets/input_variables.csv'
+        file_path
     )
     input = []
     for var in input_vars.itertuples():
@@ -71,11 +90,8 @@ def change_default(algorithm: int):
 
     result = []
     for alg in algorithms:
-        if alg.key == algorithm:
-            alg.default = 1
-        else:
-            alg.default = 0
-        result.append([alg.key, alg.name, alg.default])
+        result.append([alg.key, alg.name, 1 if alg.key == algorithm else 0])
 
     df = pd.DataFrame(result, columns=['ID', 'Name', 'Default'])
     df.to_csv('./application/assets/algorithms.csv', index=False)
+    assets.invalidate('./application/assets/algorithms.csv')
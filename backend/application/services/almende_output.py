@@ -0,0 +1,168 @@
+import bisect
+import collections
+from array import array
+
+import ijson
+
+AlmendeOutput = collections.namedtuple('AlmendeOutput', 'nodes vehicles requests totalcost')
+AlmendeNode = collections.namedtuple('AlmendeNode', 'id longitude latitude pickup storage')
+AlmendeRequest = collections.namedtuple('AlmendeRequest', 'id origin destination request_time')
+AlmendeVehicle = collections.namedtuple('AlmendeVehicle', 'id starting_location actions modes')
+
+# The prefixes of the items that are decoded one at a time while streaming.
+ITEM_PREFIXES = ('nodes.item', 'vehicles.item', 'requests.item')
+
+
+class Runs:
+    """
+    Values by minute stored as runs of equal values, for the storage of nodes and the modes of vehicles which mostly
+    stay the same for many minutes in a row.
+    """
+
+    def __init__(self, values):
+        """
+        :param values: A dict of values by (stringified) minute. Minutes that are missing have no value.
+        """
+        self.starts = array('l')
+        self.values = []
+        self.length = 0
+        for minute, value in sorted((int(minute), value) for minute, value in values.items()):
+            if minute != self.length and (len(self.values) == 0 or self.values[-1] is not None):
+                self.starts.append(self.length)
+                self.values.append(None)
+            if len(self.values) == 0 or self.values[-1] != value:
+                self.starts.append(minute)
+                self.values.append(value)
+            self.length = minute + 1
+
+    def get(self, minute, default=None):
+        """
+        :param minute: The minute of which to find the value.
+        :param default: The value returned when the minute has no value.
+        :return: The value at the minute.
+        """
+        if minute < 0 or minute >= self.length:
+            return default
+        value = self.values[bisect.bisect_right(self.starts, minute) - 1]
+        return default if value is None else value
+
+
+class ActionTable:
+    """
+    The actions of a vehicle stored column-wise, with one row for every action and the related requests kept only for
+    the rows that have them.
+    """
+
+    def __init__(self, actions):
+        """
+        :param actions: A dict of an action or a list of actions by (stringified) minute, as in Almendes output.
+        """
+        self.types = []
+        self.minutes = array('l')
+        self.kinds = array('b')
+        self.origins = array('l')
+        self.targets = array('l')
+        self.durations = array('d')
+        self.requests = {}
+        self.length = len(actions)
+        for minute, action_list in sorted((int(minute), action_list) for minute, action_list in actions.items()):
+            for action in action_list if type(action_list) == list else [action_list]:
+                if action["actionType"] not in self.types:
+                    self.types.append(action["actionType"])
+                if "relatedRequests" in action:
+                    self.requests[len(self.minutes)] = action["relatedRequests"]
+                self.minutes.append(minute)
+                self.kinds.append(self.types.index(action["actionType"]))
+                self.origins.append(action.get("from", -1))
+                self.targets.append(action.get("to", -1))
+                self.durations.append(action.get("duration", 0))
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def row(self, i):
+        """
+        :param i: The position of the action in the table.
+        :return: The action as a dict in Almendes format, together with the minute at which it takes place.
+        """
+        duration = self.durations[i]
+        action = {"actionType": self.types[self.kinds[i]], "minute": self.minutes[i],
+                  "duration": int(duration) if duration.is_integer() else duration}
+        if self.origins[i] != -1 or self.targets[i] != -1:
+            action["from"] = self.origins[i]
+            action["to"] = self.targets[i]
+        if i in self.requests:
+            action["relatedRequests"] = self.requests[i]
+        return action
+
+    def rows(self):
+        """
+        :return: A generator of all actions in order of time, see row.
+        """
+        return (self.row(i) for i in range(len(self.minutes)))
+
+
+def make_node(node):
+    """
+    :param node: A node in Almendes output format.
+    :return: The node as an AlmendeNode, with only the minutes at which its storage changes.
+    """
+    return AlmendeNode(node["id"], node["coordinates"]["longitude"], node["coordinates"]["latitude"],
+                       node["pickup"] == 1, Runs(node["storage"]))
+
+
+def make_vehicle(vehicle):
+    """
+    :param vehicle: A vehicle in Almendes output format.
+    :return: The vehicle as an AlmendeVehicle, with its actions in an ActionTable and its modes as Runs.
+    """
+    return AlmendeVehicle(vehicle["id"], vehicle["startingLocation"], ActionTable(vehicle["actions"]),
+                          Runs(vehicle["mode"]))
+
+
+def make_request(request):
+    """
+    :param request: A request in Almendes output format.
+    :return: The request as an AlmendeRequest.
+    """
+    return AlmendeRequest(request["id"], request["origin"], request["destination"], request.get("requestTime"))
+
+
+ITEM_BUILDERS = {'nodes.item': make_node, 'vehicles.item': make_vehicle, 'requests.item': make_request}
+
+
+def from_dict(data):
+    """
+    Converts an Almende output that is already decoded.
+    :param data: A JSON object containing the computed routes in Almendes output format.
+    :return: An AlmendeOutput object.
+    """
+    return AlmendeOutput([make_node(node) for node in data["nodes"]],
+                         [make_vehicle(vehicle) for vehicle in data["vehicles"]],
+                         [make_request(request) for request in data["requests"]],
+                         data["totalcost"])
+
+
+def read_almende(file):
+    """
+    Decodes an Almende output incrementally, so that only a single node, vehicle or request is held as plain JSON at a
+    time before it is converted.
+    :param file: A file object opened in binary mode containing the Almende output.
+    :return: An AlmendeOutput object.
+    """
+    items = {prefix: [] for prefix in ITEM_PREFIXES}
+    totalcost = None
+    builder = prefix_of_item = None
+    for prefix, event, value in ijson.parse(file, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == prefix_of_item and event in ('end_map', 'end_array'):
+                items[prefix_of_item].append(ITEM_BUILDERS[prefix_of_item](builder.value))
+                builder = None
+        elif prefix in ITEM_PREFIXES and event in ('start_map', 'start_array'):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            prefix_of_item = prefix
+        elif prefix == 'totalcost':
+            totalcost = value
+    return AlmendeOutput(items['nodes.item'], items['vehicles.item'], items['requests.item'], totalcost)
@@ -0,0 +1,101 @@
+import collections
+import os
+import threading
+
+from pydantic import BaseModel
+
+from application.services.metrics import count_asset
+
+AssetEntry = collections.namedtuple('AssetEntry', 'version value')
+AssetStats = collections.namedtuple('AssetStats', 'hits reloads')
+
+
+frozen_classes = {}
+frozen_classes_lock = threading.Lock()
+
+
+def frozen_class(cls):
+    """
+    :param cls: A pydantic model class.
+    :return: A subclass of the model class of which the instances cannot be modified.
+    """
+    if not cls.__config__.allow_mutation:
+        return cls
+    with frozen_classes_lock:
+        if cls not in frozen_classes:
+            config = type('Config', (), {'allow_mutation': False})
+            frozen_classes[cls] = type(cls.__name__, (cls,), {'Config': config, '__module__': cls.__module__})
+        return frozen_classes[cls]
+
+
+def freeze(value):
+    """
+    Copies a value so that it cannot be modified: pydantic models become instances of a frozen subclass, and lists
+    become tuples, recursively. The copies are equal to the originals and still instances of their model classes.
+    :param value: A model, list or other value.
+    :return: The frozen value.
+    """
+    if isinstance(value, BaseModel):
+        fields = {name: freeze(field) for name, field in value.__dict__.items()}
+        return frozen_class(type(value)).construct(_fields_set=value.__fields_set__, **fields)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class AssetStore:
+    """
+    Thread safe store of parsed input files, so that every file is read once instead of on every request. A file is
+    parsed again when its modification time or size changes. The parsed values are shared by all requests, so they
+    are frozen: lists are stored as tuples and models as frozen copies, see freeze.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str, parse):
+        """
+        Retrieves a parsed file, parsing it if it is not stored or has changed since it was stored.
+        :param path: The location of the file.
+        :param parse: The function that parses the file, called with the path.
+        :return: The result of parse, frozen.
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (os.path.abspath(path), parse)
+        with self.lock:
+            entry = self.entries.get(key)
+        hit = entry is not None and entry.version == version
+        if not hit:
+            # The version is taken before parsing, so that a file that changes while it is parsed is parsed again.
+            value = parse(path)
+            entry = AssetEntry(version, freeze(value))
+            with self.lock:
+                self.entries[key] = entry
+        with self.lock:
+            stats = self.stats.get(key[0], AssetStats(0, 0))
+            self.stats[key[0]] = AssetStats(stats.hits + int(hit), stats.reloads + int(not hit))
+        count_asset(os.path.basename(path), hit)
+        return entry.value
+
+    def invalidate(self, path: str):
+        """
+        Forgets a file, for example after writing it, when its modification time may not have changed yet.
+        :param path: The location of the file.
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                del self.entries[key]
+
+    def snapshot(self):
+        """
+        :return: A dict of AssetStats by absolute file path.
+        """
+        with self.lock:
+            return dict(self.stats)
+
+
+assets = AssetStore()
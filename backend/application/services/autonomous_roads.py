@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+from shapely.geometry import box
+
+from application.config import Settings
+from application.services.spatial_index import FeatureIndex
+from application.services.static_layer import StaticLayer
+
+settings = Settings(_env_file='./application/.env')
+
+roads = StaticLayer('./application/assets/nederlandse_grote_wegen.geojson')
+
+# Metres per degree of latitude, and of longitude at the equator.
+METRES_LAT = 110540.0
+METRES_LON = 111320.0
+
+
+class SegmentGrid:
+    """
+    Grid over the segments of a road network, to check for whole arrays of points at once whether they lie within a
+    tolerance of a road. Every segment is registered in the cells around the cells that it crosses, so the segments
+    registered in the cell of a point include all segments within the tolerance of it. Only the exact distances to
+    those candidate segments are computed.
+    """
+
+    def __init__(self, features, tolerance: float):
+        """
+        :param features: A list of GeoJSON features with (Multi)LineString geometries.
+        :param tolerance: The distance in metres within which a point is on a road.
+        """
+        self.tolerance = tolerance
+        # A segment is sampled at most a tolerance apart, so a point within the tolerance of it is less than 1.5
+        # tolerance, or less than one cell, from a sample in either direction.
+        self.cell_size = 2 * tolerance
+        lines = []
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "LineString":
+                lines.append(np.asarray(geometry["coordinates"], dtype=float)[:, :2])
+            elif geometry.get("type") == "MultiLineString":
+                lines += [np.asarray(line, dtype=float)[:, :2] for line in geometry["coordinates"]]
+        lines = [line for line in lines if len(line) > 1]
+        self.latitude = float(np.mean([line[:, 1].mean() for line in lines])) if lines else 0.0
+
+        points = [self.to_metres(line) for line in lines]
+        self.a = np.concatenate([line[:-1] for line in points]) if points else np.empty((0, 2))
+        self.b = np.concatenate([line[1:] for line in points]) if points else np.empty((0, 2))
+        steps = np.maximum(1, np.ceil(np.hypot(*(self.b - self.a).T) / tolerance)).astype(int) + 1
+        owners = np.repeat(np.arange(len(self.a)), steps)
+        fractions = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps - 1, steps)
+        samples = self.a[owners] + (self.b - self.a)[owners] * fractions[:, None]
+        cells = self.cells(samples)
+        keys = np.concatenate([cells + (dx << 32) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        segments = np.tile(owners, 9)
+        order = np.lexsort((segments, keys))
+        keys, segments = keys[order], segments[order]
+        duplicate = (keys[1:] == keys[:-1]) & (segments[1:] == segments[:-1])
+        unique = np.concatenate((np.ones(min(len(keys), 1), dtype=bool), ~duplicate))
+        self.keys, self.segments = keys[unique], segments[unique]
+
+    def to_metres(self, coordinates):
+        coordinates = np.asarray(coordinates, dtype=float)
+        return np.column_stack((coordinates[:, 0] * METRES_LON * math.cos(math.radians(self.latitude)),
+                                coordinates[:, 1] * METRES_LAT))
+
+    def cells(self, points):
+        indices = np.floor(points / self.cell_size).astype(np.int64) + (1 << 31)
+        return (indices[:, 0] << 32) + indices[:, 1]
+
+    def contains(self, coordinates):
+        """
+        Checks for every coordinate whether it lies within the tolerance of a road.
+        :param coordinates: An array of longitude, latitude pairs.
+        :return: A boolean array.
+        """
+        points = self.to_metres(coordinates)
+        keys = self.cells(points)
+        lows = np.searchsorted(self.keys, keys, 'left')
+        counts = np.searchsorted(self.keys, keys, 'right') - lows
+        owners = np.repeat(np.arange(len(points)), counts)
+        candidates = self.segments[np.repeat(lows, counts) + np.arange(counts.sum())
+                                   - np.repeat(np.cumsum(counts) - counts, counts)]
+        a, ab = self.a[candidates], self.b[candidates] - self.a[candidates]
+        t = np.clip(((points[owners] - a) * ab).sum(axis=1) / np.maximum((ab ** 2).sum(axis=1), 1e-12), 0, 1)
+        within = np.hypot(*(points[owners] - a - ab * t[:, None]).T) <= self.tolerance
+        return np.bincount(owners[within], minlength=len(points)) > 0
+
+    def runs(self, coordinates):
+        """
+        Finds the parts of a line that lie on roads. A segment of the line counts if both its ends and its middle do.
+        :param coordinates: The coordinates of the line, as longitude, latitude pairs.
+        :return: A list of [first, last] coordinate indices of the maximal parts of the line on roads.
+        """
+        points = np.asarray(coordinates, dtype=float)
+        if len(points) < 2:
+            return []
+        points = points[:, :2]
+        on_road = self.contains(points)
+        middles = self.contains((points[1:] + points[:-1]) / 2)
+        segments = on_road[1:] & on_road[:-1] & middles
+        changes = np.diff(np.concatenate(([0], segments.astype(np.int8), [0])))
+        starts = np.flatnonzero(changes == 1)
+        ends = np.flatnonzero(changes == -1)
+        return [[int(start), int(end)] for start, end in zip(starts, ends)]
+
+
+def get_road_index():
+    """
+    :return: The current snapshot of the autonomous roads and the FeatureIndex over them.
+    """
+    return roads.derive("index", lambda data: FeatureIndex(data["features"]))
+
+
+def get_segment_grid():
+    """
+    :return: The current snapshot of the autonomous roads and the SegmentGrid over them.
+    """
+    return roads.derive("grid", lambda data: SegmentGrid(data["features"], settings.AUTONOMOUS_TOLERANCE))
+
+
+def query_roads(bbox):
+    """
+    Finds the autonomous roads that intersect a bounding box.
+    :param bbox: A tuple of the west, south, east and north bounds.
+    :return: The list of road features.
+    """
+    snapshot, road_index = get_road_index()
+    area = box(*bbox)
+    return [road_index.features[i] for i in road_index.query(bbox) if area.intersects(road_index.geometries[i])]
+
+
+def get_autonomous_segments(coordinates):
+    """
+    Finds the parts of a route that can be driven autonomously.
+    :param coordinates: The coordinates of the route.
+    :return: A list of [first, last] coordinate indices of the autonomous parts of the route, which is empty if the
+    autonomous roads are not available.
+    """
+    try:
+        snapshot, grid = get_segment_grid()
+    except FileNotFoundError:
+        return []
+    return grid.runs(coordinates)
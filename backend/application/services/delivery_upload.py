@@ -0,0 +1,247 @@
+import collections
+import hashlib
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+
+from application.config import Settings
+from application.models.Delivery import Delivery
+from application.services.asset_store import frozen_class
+
+settings = Settings(_env_file='./application/.env')
+
+# The accepted names of the columns of an upload, by the names of the fields of a Delivery. The names of deliveries.csv
+# and of the Delivery model are both accepted, ignoring case.
+COLUMNS = {
+    "id": ("id",),
+    "latitude": ("lat", "latitude"),
+    "longitude": ("lon", "longitude"),
+    "needed_amt": ("needed_amount", "needed_amt"),
+}
+FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/x-arrow": "arrow",
+}
+ARROW_MAGIC = b"ARROW1"
+
+
+class UploadError(ValueError):
+    """
+    Raised when an upload cannot be read or contains invalid deliveries, with a message for the client.
+    """
+
+
+class DeliveryTable:
+    """
+    Deliveries stored as columns, as uploaded in bulk. The table can be used wherever a list of deliveries is expected:
+    it creates the Delivery objects once, on first use, without validating them again. Its handle is a hash of its
+    contents, so that uploading the same deliveries again gives the same handle.
+    """
+
+    def __init__(self, ids, latitudes, longitudes, amounts):
+        """
+        :param ids: An integer array of unique identifiers.
+        :param latitudes: A float array of latitudes.
+        :param longitudes: A float array of longitudes.
+        :param amounts: An integer array of the needed amounts.
+        """
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.amounts = np.ascontiguousarray(amounts, dtype=np.int64)
+        digest = hashlib.sha256()
+        for column in (self.ids, self.latitudes, self.longitudes, self.amounts):
+            digest.update(column.tobytes())
+        self.handle = digest.hexdigest()[:32]
+        self.models = None
+        self.lock = threading.Lock()
+
+    def deliveries(self):
+        """
+        :return: A tuple of the Delivery objects of the table, which are frozen because they are shared by requests.
+        """
+        with self.lock:
+            if self.models is None:
+                model = frozen_class(Delivery)
+                self.models = tuple(model.construct(id=i, latitude=lat, longitude=lon, needed_amt=amount)
+                                    for i, lat, lon, amount in zip(self.ids.tolist(), self.latitudes.tolist(),
+                                                                   self.longitudes.tolist(), self.amounts.tolist()))
+            return self.models
+
+    def dict(self):
+        """
+        :return: The handle of the table, by which canonical_key identifies the deliveries.
+        """
+        return {"deliveries": self.handle}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.deliveries())
+
+    def __getitem__(self, index):
+        return self.deliveries()[index]
+
+
+def upload_format(content_type: str) -> str:
+    """
+    :param content_type: The Content-Type header of an upload.
+    :return: "csv", "parquet" or "arrow".
+    :raises UploadError: if the type is not supported.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in FORMATS:
+        raise UploadError("Unsupported Content-Type " + repr(media_type) + ", use one of " + ", ".join(FORMATS))
+    return FORMATS[media_type]
+
+
+def read_frame(body: bytes, file_format: str) -> pd.DataFrame:
+    """
+    Reads an uploaded file into a data frame.
+    :param body: The contents of the file.
+    :param file_format: "csv", "parquet" or "arrow".
+    :return: The data frame.
+    """
+    if file_format == "csv":
+        return pd.read_csv(io.BytesIO(body))
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UploadError("Reading " + file_format + " uploads requires pyarrow, upload a CSV file instead")
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(pa.BufferReader(body)).to_pandas()
+    if body[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+        return pa.ipc.open_file(pa.BufferReader(body)).read_all().to_pandas()
+    return pa.ipc.open_stream(pa.BufferReader(body)).read_all().to_pandas()
+
+
+def describe(message: str, invalid, ids=None) -> str:
+    """
+    :param invalid: A boolean array of the rows that are invalid.
+    :param ids: The IDs of the rows if they are valid, else the rows are referred to by their number.
+    :return: A message about the rows that are invalid, with the first few of them.
+    """
+    rows = np.flatnonzero(invalid)
+    count = len(rows)
+    examples = ", ".join("row " + str(row + 1) if ids is None else "ID " + str(int(ids[row])) for row in rows[:5])
+    return str(count) + " rows " + message + " (" + examples + ("..." if count > 5 else "") + ")"
+
+
+def parse_ids(column: pd.Series):
+    """
+    Converts a column of identifiers to integers without passing them through floats, which cannot tell apart
+    integers above 2**53.
+    :param column: The column of identifiers.
+    :return: An int64 array of the identifiers, and a boolean array of the rows whose identifier is not an integer.
+    """
+    numbers = pd.to_numeric(column, errors="coerce")
+    if pd.api.types.is_integer_dtype(numbers.dtype):
+        values = numbers.to_numpy(dtype=np.uint64 if str(numbers.dtype).lower() == "uint64" else np.int64, na_value=0)
+        invalid = numbers.isna().to_numpy() | (values > np.iinfo(np.int64).max)
+        return np.where(invalid, 0, values).astype(np.int64), invalid
+    # Non-integer columns are checked before the conversion, and floats from 2**53 on may have been rounded already.
+    values = numbers.to_numpy(dtype=np.float64, na_value=np.nan)
+    invalid = ~np.isfinite(values) | (values != np.floor(values)) | (np.abs(values) >= 2 ** 53)
+    return np.where(invalid, 0, values).astype(np.int64), invalid
+
+
+def parse_deliveries(body: bytes, content_type: str) -> DeliveryTable:
+    """
+    Reads and validates uploaded deliveries, checking whole columns at once: the identifiers must be unique integers,
+    the coordinates must be within range and the needed amounts must be positive integers.
+    :param body: The contents of the upload.
+    :param content_type: The Content-Type header of the upload.
+    :return: The DeliveryTable of the deliveries.
+    :raises UploadError: if the upload cannot be read or contains invalid deliveries.
+    """
+    try:
+        frame = read_frame(body, upload_format(content_type))
+    except UploadError:
+        raise
+    except Exception as e:
+        raise UploadError("The upload cannot be read: " + str(e))
+
+    names = {str(name).strip().lower(): name for name in frame.columns}
+    columns = {}
+    for field, aliases in COLUMNS.items():
+        found = [names[alias] for alias in aliases if alias in names]
+        if not found:
+            raise UploadError("Missing column " + " or ".join(aliases))
+        columns[field] = frame[found[0]]
+    if len(frame) == 0:
+        raise UploadError("The upload contains no deliveries")
+    if len(frame) > settings.DELIVERY_UPLOAD_MAX_ROWS:
+        raise UploadError("The upload contains more than " + str(settings.DELIVERY_UPLOAD_MAX_ROWS) + " deliveries")
+
+    ids, bad_ids = parse_ids(columns["id"])
+    for field in ("latitude", "longitude", "needed_amt"):
+        columns[field] = pd.to_numeric(columns[field], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    checks = [("have an ID that is not an integer", bad_ids)]
+    if not bad_ids.any():
+        checks.append(("share their ID with another row", pd.Series(ids).duplicated(keep=False).to_numpy()))
+    checks += [
+        ("have a latitude that is not within [-90, 90]", ~(np.abs(columns["latitude"]) <= 90)),
+        ("have a longitude that is not within [-180, 180]", ~(np.abs(columns["longitude"]) <= 180)),
+        ("have a needed amount that is not a positive integer",
+         ~(columns["needed_amt"] > 0) | (columns["needed_amt"] != np.floor(columns["needed_amt"]))),
+    ]
+    errors = [(message, invalid) for message, invalid in checks if invalid.any()]
+    if errors:
+        labels = None if bad_ids.any() else ids
+        raise UploadError("; ".join(describe(message, invalid, labels) for message, invalid in errors))
+    return DeliveryTable(ids, columns["latitude"], columns["longitude"], columns["needed_amt"])
+
+
+class DeliveryStore:
+    """
+    Thread safe store of uploaded delivery tables by handle. When the tables together hold more deliveries than the
+    size of the store, the least recently used ones are forgotten first.
+    """
+
+    def __init__(self, size: int):
+        """
+        :param size: The maximum total number of deliveries kept.
+        """
+        self.size = size
+        self.tables = collections.OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def put(self, table: DeliveryTable):
+        """
+        Stores a table under its handle.
+        :param table: The DeliveryTable.
+        """
+        with self.lock:
+            if table.handle in self.tables:
+                self.tables.move_to_end(table.handle)
+                return
+            self.tables[table.handle] = table
+            self.used += len(table)
+            while self.used > self.size and len(self.tables) > 1:
+                handle, evicted = self.tables.popitem(last=False)
+                self.used -= len(evicted)
+
+    def get(self, handle: str):
+        """
+        :param handle: The handle of a table.
+        :return: The DeliveryTable, or None if it is not stored.
+        """
+        with self.lock:
+            table = self.tables.get(handle)
+            if table is not None:
+                self.tables.move_to_end(handle)
+            return table
+
+
+uploads = DeliveryStore(settings.DELIVERY_STORE_SIZE)
@@ -0,0 +1,164 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DirectionsCache:
+    """
+    Two tier cache for ORS directions results: a least recently used cache in memory, backed by an SQLite file that
+    survives restarts. Results are keyed by a hash of the profile and the rounded coordinates of the route, and both
+    tiers are bounded by the size in bytes of the JSON encoding of the results. On disk, the last use of a result is
+    only recorded to the nearest interval, so that most hits do not write.
+    """
+
+    def __init__(self, size: int, path: str = "", disk_size: int = 0, precision: int = 6, interval: float = 3600):
+        """
+        :param size: The maximum total size in bytes of the results kept in memory.
+        :param path: The location of the SQLite file, the disk tier is disabled if it is empty.
+        :param disk_size: The maximum total size in bytes of the results kept on disk.
+        :param precision: The number of decimals to which coordinates are rounded in the key.
+        :param interval: The number of seconds to which the last use of a result on disk is rounded.
+        """
+        self.size = size
+        self.path = path
+        self.disk_size = disk_size
+        self.precision = precision
+        self.interval = interval
+        self.memory = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.connection = None
+        self.used = self.disk_used = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+    def key(self, profile, coordinate_list):
+        """
+        Computes the canonical key of a directions request.
+        :param profile: The ORS routing profile of the request.
+        :param coordinate_list: The list of coordinates between which the route is calculated.
+        :return: A hexadecimal hash identifying the request.
+        """
+        coordinates = [[round(float(c), self.precision) for c in coordinate] for coordinate in coordinate_list]
+        return hashlib.sha256(json.dumps([profile, coordinates], separators=(',', ':')).encode()).hexdigest()
+
+    def bucket(self):
+        """
+        :return: The current time rounded down to the interval, as stored for the last use of a result on disk.
+        """
+        return int(time.time() // self.interval)
+
+    def get(self, key):
+        """
+        Retrieves a result from memory, or else from disk.
+        :param key: The key of the result.
+        :return: The cached result, or None if it is not cached.
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key][0]
+            connection = self.connect()
+            if connection is not None:
+                row = connection.execute("SELECT value, used FROM directions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    bucket = self.bucket()
+                    if row[1] < bucket:
+                        connection.execute("UPDATE directions SET used = ? WHERE key = ?", (bucket, key))
+                        connection.commit()
+                    value = tuple(json.loads(row[0]))
+                    self.remember(key, value, len(row[0]))
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Stores a result in memory and on disk, evicting the least recently used results when a tier is full.
+        :param key: The key of the result.
+        :param value: The result, which must be JSON serializable.
+        """
+        encoded = json.dumps(value)
+        with self.lock:
+            self.remember(key, value, len(encoded))
+            connection = self.connect()
+            if connection is not None:
+                row = connection.execute("SELECT size FROM directions WHERE key = ?", (key,)).fetchone()
+                self.disk_used += len(encoded) - (row[0] if row is not None else 0)
+                connection.execute("INSERT OR REPLACE INTO directions (key, value, used, size) VALUES (?, ?, ?, ?)",
+                                   (key, encoded, self.bucket(), len(encoded)))
+                if self.disk_used > self.disk_size:
+                    evicted = []
+                    cursor = connection.execute("SELECT key, size FROM directions WHERE key != ? ORDER BY used, rowid",
+                                                (key,))
+                    for old, size in cursor:
+                        if self.disk_used <= self.disk_size:
+                            break
+                        evicted.append((old,))
+                        self.disk_used -= size
+                    cursor.close()
+                    connection.executemany("DELETE FROM directions WHERE key = ?", evicted)
+                connection.commit()
+
+    def remember(self, key, value, size):
+        """
+        Stores a result in the memory tier, the lock must be held by the caller.
+        :param size: The size in bytes of the JSON encoding of the result.
+        """
+        if key in self.memory:
+            self.used -= self.memory[key][1]
+        self.memory[key] = (value, size)
+        self.memory.move_to_end(key)
+        self.used += size
+        while self.used > self.size and len(self.memory) > 1:
+            self.used -= self.memory.popitem(last=False)[1][1]
+
+    def connect(self):
+        """
+        Opens the disk tier on first use, the lock must be held by the caller.
+        :return: The SQLite connection, or None if the disk tier is disabled.
+        """
+        if self.connection is None and self.path != "" and self.disk_size > 0:
+            directory = os.path.dirname(self.path)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS directions "
+                                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used INTEGER NOT NULL, "
+                                    "size INTEGER NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS directions_used ON directions (used)")
+            self.connection.commit()
+            self.disk_used = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM directions").fetchone()[0]
+        return self.connection
+
+    def clear(self):
+        """
+        Empties both tiers and resets the counters.
+        """
+        with self.lock:
+            self.memory.clear()
+            self.used = 0
+            connection = self.connect()
+            if connection is not None:
+                connection.execute("DELETE FROM directions")
+                connection.commit()
+                self.disk_used = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """
+        :return: A dict with the hit and miss counters, and the number and total size in bytes of the results kept in
+        memory.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self.memory),
+                "bytes": self.used
+            }
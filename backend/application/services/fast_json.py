@@ -0,0 +1,39 @@
+import json
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """
+    Encodes the objects the standard json module does not know, such as numpy arrays and scalars.
+    """
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError("Object of type " + type(obj).__name__ + " is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    Encodes trusted data to JSON with orjson, or with the standard json module if orjson is not installed.
+    :param content: The data to encode, which may contain numpy arrays.
+    :return: The JSON encoded data.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, separators=(',', ':'), default=default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Response that encodes its content directly with dumps. Returning it from an endpoint skips the validation against
+    the response_model of the endpoint, which is still used for the OpenAPI schema, so it must only be used for data
+    that is already known to match that model.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
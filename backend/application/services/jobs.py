@@ -0,0 +1,108 @@
+import collections
+import concurrent.futures
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue of a JobQueue is full.
+    """
+
+
+class Job:
+    """
+    A computation that runs on a JobQueue, together with its progress and its result once it is finished.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    def progress(self, done: int, total: int):
+        """
+        Reports the progress of the job, called by the computation.
+        :param done: The number of steps that are done.
+        :param total: The total number of steps.
+        """
+        self.done = done
+        self.total = total
+
+    def to_dict(self):
+        """
+        :return: The status and progress of the job, in the format returned by the api.
+        """
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "error": self.error,
+            "submitted": self.submitted,
+            "finished": self.finished
+        }
+
+
+class JobQueue:
+    """
+    A bounded pool of worker threads running jobs. At most a fixed number of jobs may wait or run at once, so that a
+    burst of submissions is refused instead of piling up, and only the most recently submitted jobs are remembered.
+    """
+
+    def __init__(self, workers: int, queue_size: int, history: int):
+        """
+        :param workers: The number of jobs that run at the same time.
+        :param queue_size: The number of jobs that may wait or run before submissions are refused.
+        :param history: The number of jobs that are remembered, including the finished ones.
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.queue_size = queue_size
+        self.history = history
+        self.jobs = collections.OrderedDict()
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, compute) -> Job:
+        """
+        Queues a computation.
+        :param compute: A function that takes the progress function of the job and returns the result.
+        :return: The Job.
+        :raises QueueFull: If the queue is full.
+        """
+        job = Job()
+        with self.lock:
+            if self.pending >= self.queue_size:
+                raise QueueFull()
+            self.pending += 1
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.history and next(iter(self.jobs.values())).finished is not None:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self.run, job, compute)
+        return job
+
+    def run(self, job: Job, compute):
+        job.status = "running"
+        try:
+            job.result = compute(job.progress)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            with self.lock:
+                self.pending -= 1
+
+    def get(self, job_id: str):
+        """
+        :param job_id: The identifier of the job.
+        :return: The Job, or None if it is not known.
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
@@ -0,0 +1,141 @@
+import functools
+import inspect
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+from application.config import Settings
+
+settings = Settings(_env_file='./application/.env')
+
+ENABLED = settings.METRICS_ENABLED
+
+STAGE_SECONDS = Histogram("backend_stage_seconds", "Duration of the stages of computing and serving routes.",
+                          ["stage"])
+EXTERNAL_CALLS = Counter("backend_external_calls_total", "Requests to external services.",
+                         ["service", "endpoint", "outcome"])
+EXTERNAL_SECONDS = Histogram("backend_external_call_seconds", "Duration of requests to external services.",
+                             ["service", "endpoint"])
+CACHE_LOOKUPS = Counter("backend_cache_lookups_total", "Lookups in the caches of the backend.", ["cache", "result"])
+ASSET_LOADS = Counter("backend_asset_loads_total", "Retrievals of input files from the asset store.",
+                      ["asset", "result"])
+REQUESTS_IN_FLIGHT = Gauge("backend_requests_in_flight", "Requests that are being handled.")
+REQUEST_SECONDS = Histogram("backend_request_seconds", "Duration of handling requests.", ["handler", "status"])
+
+
+def timed(stage: str):
+    """
+    Decorates a function to record its duration as a stage. When metrics are disabled the function is returned as is,
+    so that it has no overhead at all. Of a generator function, the time spent generating all of its items is
+    recorded once it is exhausted or closed, excluding the time spent by its consumer in between.
+    :param stage: The name of the stage.
+    :return: The decorator.
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+        histogram = STAGE_SECONDS.labels(stage)
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                generator = function(*args, **kwargs)
+                elapsed = 0.0
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            elapsed += time.perf_counter() - start
+                        yield item
+                finally:
+                    generator.close()
+                    histogram.observe(elapsed)
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count_cache(cache: str, hit: bool):
+    """
+    Records a lookup in a cache.
+    :param cache: The name of the cache.
+    :param hit: Whether the lookup found a value.
+    """
+    if ENABLED:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def count_asset(asset: str, hit: bool):
+    """
+    Records a retrieval of an input file from the asset store.
+    :param asset: The name of the file.
+    :param hit: Whether the stored file was still up to date, rather than parsed again.
+    """
+    if ENABLED:
+        ASSET_LOADS.labels(asset, "hit" if hit else "reload").inc()
+
+
+def observe_external(service: str, endpoint: str, seconds: float, failed: bool):
+    """
+    Records a request to an external service.
+    :param service: The name of the service.
+    :param endpoint: The path of the endpoint requested, without parameters.
+    :param seconds: The duration of the request.
+    :param failed: Whether the request failed.
+    """
+    if ENABLED:
+        EXTERNAL_CALLS.labels(service, endpoint, "error" if failed else "ok").inc()
+        EXTERNAL_SECONDS.labels(service, endpoint).observe(seconds)
+
+
+async def track_requests(request, call_next):
+    """
+    Middleware that records the requests in flight and the duration of every request by handler. A request counts as
+    handled once its whole body is sent, which for a streaming response is long after call_next returns.
+    """
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish_request(request, start, 500)
+        raise
+    response.body_iterator = track_body(response.body_iterator, request, start, response.status_code)
+    return response
+
+
+async def track_body(body, request, start: float, status: int):
+    """
+    Passes on the body of a response, recording the request as handled when the body is sent or sending it fails.
+    """
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        finish_request(request, start, status)
+
+
+def finish_request(request, start: float, status: int):
+    REQUESTS_IN_FLIGHT.dec()
+    endpoint = request.scope.get("endpoint")
+    handler = endpoint.__module__.split(".")[-1] + "." + endpoint.__name__ if endpoint is not None else "unknown"
+    REQUEST_SECONDS.labels(handler, str(status)).observe(time.perf_counter() - start)
+
+
+def render():
+    """
+    :return: The current value of all metrics in the Prometheus text format, and its content type.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,227 @@
+import asyncio
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+
+import openrouteservice
+import requests
+from openrouteservice import exceptions
+
+from application.config import Settings
+from application.services.metrics import observe_external
+
+settings = Settings(_env_file='./application/.env')
+
+DEFAULT_BASE_URL = 'https://api.openrouteservice.org'
+
+
+class ServerBusy(Exception):
+    """
+    Raised when ORS responds with a server error that openrouteservice.Client would retry.
+    """
+
+
+# Failures that mean ORS is busy, over its quota or unreachable, rather than that the request is wrong.
+RETRIABLE_ERRORS = (ServerBusy, exceptions._OverQueryLimit, exceptions.Timeout, requests.exceptions.ConnectionError)
+
+EndpointStats = collections.namedtuple('EndpointStats', 'requests errors retries seconds max_seconds')
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket that spaces out requests to a rate, allowing short bursts.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: The number of tokens added per second, 0 disables the limit.
+        :param burst: The maximum number of tokens saved up.
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def delay(self) -> float:
+        """
+        Takes a token, reserving one that is added in the future if there is none.
+        :return: The number of seconds to wait before the token may be used.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        wait = self.delay()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class LatencyMetrics:
+    """
+    Thread safe counters of the requests, failures, retries and latencies per endpoint.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint: str, seconds: float, failed: bool, retried: bool):
+        """
+        :param endpoint: The path of the endpoint requested.
+        :param seconds: The duration of the request.
+        :param failed: Whether the request failed.
+        :param retried: Whether the request was a retry.
+        """
+        with self.lock:
+            stats = self.stats.get(endpoint, EndpointStats(0, 0, 0, 0.0, 0.0))
+            self.stats[endpoint] = EndpointStats(stats.requests + 1, stats.errors + int(failed),
+                                                 stats.retries + int(retried), stats.seconds + seconds,
+                                                 max(stats.max_seconds, seconds))
+
+    def snapshot(self):
+        """
+        :return: A dict of EndpointStats by endpoint.
+        """
+        with self.lock:
+            return dict(self.stats)
+
+
+def backoff_delay(base: float, attempt: int, response=None) -> float:
+    """
+    Computes the time to wait before a retry, as a random fraction of an exponentially growing delay, so that clients
+    that failed together do not retry together. A Retry-After header of the response is respected.
+    :param base: The delay before the first retry in seconds.
+    :param attempt: The number of the retry, starting at 1.
+    :param response: The response that failed, if any.
+    :return: The number of seconds to wait.
+    """
+    delay = random.uniform(0, base * 2 ** (attempt - 1))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after is not None and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+class OrsGateway(openrouteservice.Client):
+    """
+    Client for ORS that is shared by the whole process. It keeps a pool of keep-alive connections, spaces out its
+    requests with a token bucket, retries requests that fail because ORS is busy with jittered exponential backoff,
+    and measures the latency per endpoint. All API methods of openrouteservice.Client, such as directions and
+    optimization, are available, and have an async variant through call_async.
+    """
+
+    def __init__(self, key=None, base_url=DEFAULT_BASE_URL, rate=0.0, burst=1, retries=0, backoff=0.5, pool_size=10,
+                 timeout=60):
+        """
+        :param key: The ORS API key, which is not needed for an own ORS instance.
+        :param base_url: The URL of the ORS instance.
+        :param rate: The maximum number of requests per second, 0 disables the limit.
+        :param burst: The number of requests that may be made at once before the rate applies.
+        :param retries: The number of times a failed request is retried.
+        :param backoff: The delay before the first retry in seconds, doubled for every next retry.
+        :param pool_size: The number of connections kept open.
+        :param timeout: The timeout of a single request in seconds.
+        """
+        super().__init__(key=key, base_url=base_url, timeout=timeout, retry_over_query_limit=False,
+                         requests_kwargs={"hooks": {"response": self.remember_response}})
+        # openrouteservice.Client offers no way to pass a session, so the pool is mounted on the one it creates.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = LatencyMetrics()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ors")
+        self.local = threading.local()
+
+    def remember_response(self, response, *args, **kwargs):
+        """
+        Response hook of requests that keeps the last response of the thread, for its Retry-After header.
+        """
+        self.local.response = response
+        return response
+
+    def request(self, url, get_params=None, first_request_time=None, retry_counter=0, requests_kwargs=None,
+                post_json=None, dry_run=None):
+        """
+        Performs a request to ORS, used by all API methods. Every attempt is a call to openrouteservice.Client.request,
+        of which the own retries are replaced by the rate limited, jittered retries of the gateway.
+        :return: The body of the response.
+        :raises ApiError: when ORS returns an error, or is still busy after all retries.
+        :raises Timeout: if the last attempt timed out.
+        """
+        if retry_counter > 0:
+            # openrouteservice.Client retries server errors by calling request again, which the loop below does instead.
+            raise ServerBusy()
+
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self.local.response = None
+            start = time.perf_counter()
+            try:
+                body = super().request(url, get_params, requests_kwargs=requests_kwargs, post_json=post_json,
+                                       dry_run=dry_run)
+            except RETRIABLE_ERRORS as e:
+                failure = e
+            except Exception:
+                self.observe(url, start, True, attempt)
+                raise
+            else:
+                self.observe(url, start, False, attempt)
+                return body
+            self.observe(url, start, True, attempt)
+            if attempt < self.retries:
+                time.sleep(backoff_delay(self.backoff, attempt + 1, self.local.response))
+        if isinstance(failure, ServerBusy):
+            response = self.local.response
+            raise exceptions.ApiError(503 if response is None else response.status_code,
+                                      "ORS is still busy after all retries")
+        raise failure
+
+    def observe(self, url, start, failed, attempt):
+        elapsed = time.perf_counter() - start
+        self.metrics.observe(url, elapsed, failed, attempt > 0)
+        observe_external("ors", url, elapsed, failed)
+
+    async def call_async(self, method, *args, **kwargs):
+        """
+        Performs a request in the connection pool of the gateway without blocking the event loop.
+        :param method: The name of the API method, for example "directions".
+        :return: The body of the response.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, lambda: getattr(self, method)(*args, **kwargs))
+
+
+gateways = {}
+gateways_lock = threading.Lock()
+
+
+def get_gateway(key=None, base_url=""):
+    """
+    Returns the gateway of the process for an ORS instance, creating it on first use.
+    :param key: The ORS API key.
+    :param base_url: The URL of the ORS instance, or an empty string for the public API.
+    :return: The OrsGateway.
+    """
+    base_url = base_url or DEFAULT_BASE_URL
+    # The quota of the public API does not apply to an own instance.
+    rate = settings.ORS_RATE_LIMIT if base_url == DEFAULT_BASE_URL else settings.ORS_URL_RATE_LIMIT
+    with gateways_lock:
+        if (key, base_url) not in gateways:
+            gateways[key, base_url] = OrsGateway(key, base_url, rate, settings.ORS_BURST, settings.ORS_RETRIES,
+                                                 settings.ORS_BACKOFF, settings.ORS_MAX_WORKERS)
+        return gateways[key, base_url]
@@ -0,0 +1,83 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+
+CachedResult = collections.namedtuple('CachedResult', 'expires body value')
+
+
+def canonical_key(*parts) -> str:
+    """
+    Hashes the inputs of a computation so that equal inputs give the same key, regardless of the order of their keys.
+    :param parts: The inputs, which may be pydantic models, lists of them, or plain JSON data.
+    :return: The hexadecimal SHA-256 hash of the canonical JSON encoding of the inputs.
+    """
+    def plain(obj):
+        if hasattr(obj, "dict"):
+            return obj.dict()
+        raise TypeError("Object of type " + type(obj).__name__ + " cannot be hashed")
+
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=plain)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread safe cache of encoded results that expire after a while. When the encoded results together grow larger
+    than the size of the cache, the least recently used ones are forgotten first.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        """
+        :param size: The maximum total size of the encoded results in bytes, 0 disables the cache.
+        :param ttl: The number of seconds a result is kept.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        :param key: The key of the result.
+        :return: The CachedResult, or None if the result is not cached or has expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, body: bytes, value=None):
+        """
+        Caches a result, unless it alone is larger than the cache.
+        :param key: The key of the result.
+        :param body: The encoded result.
+        :param value: Anything to keep along with the encoded result.
+        :return: The CachedResult.
+        """
+        entry = CachedResult(time.monotonic() + self.ttl, body, value)
+        if len(body) > self.size:
+            return entry
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = entry
+            self.used += len(body)
+            while self.used > self.size:
+                self.remove(next(iter(self.entries)))
+        return entry
+
+    def remove(self, key: str):
+        self.used -= len(self.entries.pop(key).body)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
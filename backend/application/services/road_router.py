@@ -0,0 +1,216 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+
+import networkx as nx
+from rtree import index
+
+# Average speed in metres per second used for edges without a travel time, roughly 50 km/h.
+DEFAULT_SPEED = 50 / 3.6
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Computes the great-circle distance between two coordinates.
+    :return: The distance in metres.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RoadRouter:
+    """
+    In-process replacement for the ORS directions service, routing over a prepared road graph with A*.
+    The graph is a networkx (Multi)DiGraph as produced by osmnx: nodes have 'x' and 'y' coordinates, edges have a
+    'length' in metres and optionally a 'geometry' LineString and a 'travel_time' in seconds.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = list(graph.nodes)
+        self.components = None
+        self.lengths = None
+        self.lock = threading.Lock()
+        self.index = index.Index(
+            (i, (graph.nodes[n]['x'], graph.nodes[n]['y'], graph.nodes[n]['x'], graph.nodes[n]['y']), None)
+            for i, n in enumerate(self.nodes))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Loads a road graph that was saved with osmnx.
+        :param path: The location of the GraphML file.
+        :return: A RoadRouter object for the graph.
+        """
+        import osmnx as ox
+        folder, filename = os.path.split(path)
+        graph = ox.load_graphml(filename, folder=folder or ".")
+        # osmnx 0.12 only converts the lengths of edges to numbers.
+        for u, v, data in graph.edges(data=True):
+            if 'travel_time' in data:
+                data['travel_time'] = float(data['travel_time'])
+        return cls(graph)
+
+    def nearest_node(self, coordinates):
+        """
+        Finds the node of the graph closest to a coordinate.
+        :param coordinates: A longitude, latitude pair.
+        :return: The identifier of the nearest node.
+        """
+        lon, lat = coordinates[0], coordinates[1]
+        return self.nodes[next(self.index.nearest((lon, lat, lon, lat), 1))]
+
+    def component(self, node):
+        """
+        Finds the strongly connected component of a node, computing the components of the graph on first use.
+        Two nodes can be driven between in both directions if and only if they are in the same component.
+        :param node: The identifier of a node.
+        :return: The number of the component of the node.
+        """
+        with self.lock:
+            if self.components is None:
+                self.components = {n: c for c, nodes in enumerate(nx.strongly_connected_components(self.graph))
+                                   for n in nodes}
+        return self.components[node]
+
+    def heuristic(self, u, v):
+        nu, nv = self.graph.nodes[u], self.graph.nodes[v]
+        return haversine(nu['x'], nu['y'], nv['x'], nv['y'])
+
+    def edge(self, u, v):
+        """
+        Retrieves the data of the shortest edge between two adjacent nodes.
+        """
+        data = self.graph.get_edge_data(u, v)
+        if self.graph.is_multigraph():
+            return min(data.values(), key=lambda d: d.get('length', 0))
+        return data
+
+    def adjacency(self):
+        """
+        Computes the length of the shortest edge between every two adjacent nodes on first use.
+        :return: Dicts of the lengths by node and successor, and by node and predecessor.
+        """
+        with self.lock:
+            if self.lengths is None:
+                forward = {node: {} for node in self.graph.nodes}
+                backward = {node: {} for node in self.graph.nodes}
+                for u, v, length in self.graph.edges(data='length', default=0):
+                    if length < forward[u].get(v, math.inf):
+                        forward[u][v] = backward[v][u] = length
+                self.lengths = forward, backward
+        return self.lengths
+
+    def shortest_path(self, source, target):
+        """
+        Finds the shortest path between two nodes by length with bidirectional A*. Both searches use the average of
+        the forward and backward straight line potentials, so that they may stop as soon as they meet.
+        :return: The list of nodes of the path.
+        :raises NetworkXNoPath: If the target cannot be reached from the source.
+        """
+        if source == target:
+            return [source]
+        potentials = {}
+
+        def potential(node):
+            if node not in potentials:
+                potentials[node] = (self.heuristic(node, target) - self.heuristic(source, node)) / 2
+            return potentials[node]
+
+        neighbours = self.adjacency()
+        distances = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        settled = (set(), set())
+        counter = itertools.count()
+        heaps = ([(0.0, next(counter), source)], [(0.0, next(counter), target)])
+        best, meeting = math.inf, None
+        while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            distance, _, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            for v, length in neighbours[side][u].items():
+                # The costs reduced by the potentials are the same in both directions.
+                reduced = length + (potential(v) - potential(u) if side == 0 else potential(u) - potential(v))
+                candidate = distance + reduced
+                if candidate < distances[side].get(v, math.inf):
+                    distances[side][v] = candidate
+                    parents[side][v] = u
+                    heapq.heappush(heaps[side], (candidate, next(counter), v))
+                    if v in distances[1 - side] and candidate + distances[1 - side][v] < best:
+                        best, meeting = candidate + distances[1 - side][v], v
+        if meeting is None:
+            raise nx.NetworkXNoPath("No path between " + str(source) + " and " + str(target))
+
+        path = [meeting]
+        while parents[0][path[-1]] is not None:
+            path.append(parents[0][path[-1]])
+        path.reverse()
+        while parents[1][path[-1]] is not None:
+            path.append(parents[1][path[-1]])
+        return path
+
+    def leg(self, source, target):
+        """
+        Computes the shortest path between two nodes.
+        :return: The distance in metres, the duration in seconds and the coordinates of the path.
+        """
+        path = self.shortest_path(source, target)
+        start = self.graph.nodes[source]
+        coordinates = [[start['x'], start['y']]]
+        distance = duration = 0.0
+        for u, v in zip(path, path[1:]):
+            data = self.edge(u, v)
+            length = data.get('length', 0)
+            distance += length
+            duration += data.get('travel_time', length / DEFAULT_SPEED)
+            if 'geometry' in data:
+                points = [list(point) for point in data['geometry'].coords]
+                if points[0] != coordinates[-1]:
+                    points.reverse()
+                coordinates += points[1:]
+            else:
+                end = self.graph.nodes[v]
+                coordinates.append([end['x'], end['y']])
+        return distance, duration, coordinates
+
+    def directions(self, coordinate_list):
+        """
+        Computes a route along a list of coordinates in the shape of ors_directions.
+        :param coordinate_list: A list of coordinates between which to calculate a route.
+        :return: The distance of the route, the coordinates of the route, and the information of stopovers.
+        """
+        nodes = [self.nearest_node(coordinates) for coordinates in coordinate_list]
+        start = self.graph.nodes[nodes[0]]
+        geometry = [[start['x'], start['y']]]
+        segments = []
+        total = 0.0
+        for source, target in zip(nodes, nodes[1:]):
+            distance, duration, coordinates = self.leg(source, target)
+            geometry += coordinates[1:]
+            segments.append({"distance": round(distance, 1), "duration": round(duration, 1), "steps": []})
+            total += distance
+        return round(total, 1), geometry, segments
+
+
+router_lock = threading.Lock()
+routers = {}
+
+
+def get_router(path: str) -> RoadRouter:
+    """
+    Retrieves the router for a road graph, loading the graph on first use.
+    :param path: The location of the GraphML file.
+    :return: The RoadRouter object for the graph.
+    """
+    with router_lock:
+        if path not in routers:
+            routers[path] = RoadRouter.load(path)
+        return routers[path]
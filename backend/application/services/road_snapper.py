@@ -0,0 +1,139 @@
+import math
+import threading
+
+import numpy as np
+from rtree import index
+
+from application.services.road_router import get_router
+
+# Metres per degree of latitude, and of longitude at the equator.
+METRES_LAT = 110540.0
+METRES_LON = 111320.0
+# The number of points of which the candidate segments are compared at once, which bounds the memory used.
+CHUNK_SIZE = 4096
+
+
+class RoadSnapper:
+    """
+    Snaps points to the nearest road of a road graph, as a local replacement for the nearest service of OSRM.
+    The edges of the graph are cut into segments no longer than a grid cell, which are bucketed by the cell of their
+    middle. Points are snapped in bulk by comparing them with all segments in the surrounding cells at once, which finds
+    the nearest segment for every point that is within half a cell of a road. Points further away are snapped one at a
+    time with an R-tree over the segments.
+    """
+
+    def __init__(self, graph, cell_size: float = 100.0):
+        """
+        :param graph: A networkx (Multi)DiGraph as produced by osmnx, of which every edge is a road.
+        :param cell_size: The size of a grid cell in metres.
+        """
+        self.cell_size = cell_size
+        lines = []
+        for u, v, data in graph.edges(data=True):
+            if 'geometry' in data:
+                lines.append(np.asarray(data['geometry'].coords, dtype=float)[:, :2])
+            else:
+                lines.append(np.array([[graph.nodes[u]['x'], graph.nodes[u]['y']],
+                                       [graph.nodes[v]['x'], graph.nodes[v]['y']]]))
+        self.latitude = float(np.mean([line[:, 1].mean() for line in lines])) if lines else 0.0
+        self.scale = np.array([METRES_LON * math.cos(math.radians(self.latitude)), METRES_LAT])
+
+        starts = np.concatenate([line[:-1] for line in lines]) * self.scale
+        ends = np.concatenate([line[1:] for line in lines]) * self.scale
+        pieces = np.maximum(1, np.ceil(np.hypot(*(ends - starts).T) / cell_size)).astype(int)
+        fractions = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        starts, ends = np.repeat(starts, pieces, axis=0), np.repeat(ends, pieces, axis=0)
+        steps = (ends - starts) / np.repeat(pieces, pieces)[:, None]
+        a = starts + steps * fractions[:, None]
+        b = a + steps
+
+        keys = self.cells((a + b) / 2)
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.a, self.b = keys[order], a[order], b[order]
+        lows, highs = np.minimum(self.a, self.b), np.maximum(self.a, self.b)
+        self.index = index.Index((i, (low[0], low[1], high[0], high[1]), None)
+                                 for i, (low, high) in enumerate(zip(lows, highs)))
+
+    def cells(self, points):
+        """
+        :param points: An array of points in metres.
+        :return: The keys of the grid cells of the points.
+        """
+        indices = np.floor(points / self.cell_size).astype(np.int64) + (1 << 31)
+        return (indices[:, 0] << 32) + indices[:, 1]
+
+    def project(self, points, segments):
+        """
+        Projects points onto segments, pairwise.
+        :return: The projected points and their distances to the points.
+        """
+        a, b = self.a[segments], self.b[segments]
+        ab = b - a
+        length = np.maximum((ab ** 2).sum(axis=1), 1e-12)
+        t = np.clip(((points - a) * ab).sum(axis=1) / length, 0, 1)
+        projected = a + ab * t[:, None]
+        return projected, np.hypot(*(points - projected).T)
+
+    def snap(self, coordinates):
+        """
+        Snaps points to the nearest road.
+        :param coordinates: An array of latitude, longitude pairs.
+        :return: An array of the latitude, longitude pairs of the snapped points, and an array of the distances in
+        metres between the points and the snapped points.
+        """
+        points = np.asarray(coordinates, dtype=float)[:, ::-1] * self.scale
+        snapped = np.empty_like(points)
+        distances = np.full(len(points), np.inf)
+        for first in range(0, len(points), CHUNK_SIZE):
+            chunk = slice(first, first + CHUNK_SIZE)
+            snapped[chunk], distances[chunk] = self.snap_nearby(points[chunk])
+        for i in np.flatnonzero(distances > self.cell_size / 2):
+            x, y = points[i]
+            segments = np.fromiter(self.index.nearest((x, y, x, y), 16), dtype=np.int64)
+            projected, found = self.project(np.repeat(points[i:i + 1], len(segments), axis=0), segments)
+            snapped[i], distances[i] = projected[np.argmin(found)], found.min()
+        return (snapped / self.scale)[:, ::-1], distances
+
+    def snap_nearby(self, points):
+        """
+        Snaps points to the nearest segment in the surrounding cells, see snap.
+        :param points: An array of points in metres.
+        :return: The snapped points in metres and their distances, which are infinite if there is no segment nearby.
+        """
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        lows, highs = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = ((cells[:, 0] + dx + (1 << 31)) << 32) + cells[:, 1] + dy + (1 << 31)
+                lows.append(np.searchsorted(self.keys, keys, 'left'))
+                highs.append(np.searchsorted(self.keys, keys, 'right'))
+        lows, highs = np.column_stack(lows).ravel(), np.column_stack(highs).ravel()
+        counts = highs - lows
+        owners = np.repeat(np.repeat(np.arange(len(points)), 9), counts)
+        segments = np.repeat(lows, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        snapped = points.copy()
+        distances = np.full(len(points), np.inf)
+        if len(segments) > 0:
+            projected, found = self.project(points[owners], segments)
+            order = np.lexsort((found, owners))
+            first = order[np.flatnonzero(np.diff(np.concatenate(([-1], owners[order]))))]
+            snapped[owners[first]] = projected[first]
+            distances[owners[first]] = found[first]
+        return snapped, distances
+
+
+snapper_lock = threading.Lock()
+snappers = {}
+
+
+def get_snapper(path: str) -> RoadSnapper:
+    """
+    Retrieves the snapper for a road graph, sharing the graph loaded by the router.
+    :param path: The location of the GraphML file.
+    :return: The RoadSnapper object for the graph.
+    """
+    with snapper_lock:
+        if path not in snappers:
+            snappers[path] = RoadSnapper(get_router(path).graph)
+        return snappers[path]
@@ -0,0 +1,31 @@
+from rtree import index
+from shapely.geometry import shape
+
+
+class FeatureIndex:
+    """
+    R-tree over the geometries of a list of GeoJSON features, answering bounding box queries without a full scan.
+    """
+
+    def __init__(self, features):
+        """
+        :param features: A list of GeoJSON features, features without a geometry are left out of the index.
+        """
+        self.features = []
+        self.geometries = []
+        self.properties = []
+        for feature in features:
+            if feature.get("geometry") and feature["geometry"].get("coordinates"):
+                self.features.append(feature)
+                self.geometries.append(shape(feature["geometry"]))
+                self.properties.append(feature.get("properties") or {})
+        self.index = index.Index((i, geometry.bounds, None) for i, geometry in enumerate(self.geometries)
+                                 if not geometry.is_empty)
+
+    def query(self, bbox):
+        """
+        Finds the features whose bounding box intersects a bounding box.
+        :param bbox: A tuple of the west, south, east and north bounds.
+        :return: A sorted list of the positions of the features in the index.
+        """
+        return sorted(self.index.intersection(bbox))
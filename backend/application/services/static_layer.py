@@ -0,0 +1,112 @@
+import collections
+import email.utils
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from application.services.fast_json import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LayerSnapshot = collections.namedtuple('LayerSnapshot', 'mtime size etag last_modified data body gzip brotli')
+
+
+class StaticLayer:
+    """
+    A static GeoJSON file that is parsed and encoded once, and kept in memory together with its compressed variants.
+    The file is loaded on first use and only loaded again when its modification time or size changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.derived = {}
+
+    def get(self) -> LayerSnapshot:
+        """
+        Retrieves the current contents of the file, reloading it if it has changed on disk.
+        :return: A LayerSnapshot object with the parsed data, the encoded body and its validators.
+        """
+        stat = os.stat(self.path)
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.mtime != stat.st_mtime or snapshot.size != stat.st_size:
+            with self.lock:
+                if self.snapshot is None or self.snapshot.mtime != stat.st_mtime or \
+                        self.snapshot.size != stat.st_size:
+                    self.snapshot = self.load(stat)
+                snapshot = self.snapshot
+        return snapshot
+
+    def derive(self, name: str, build):
+        """
+        Retrieves a structure derived from the current contents of the file, such as a spatial index, building it once
+        per version of the file.
+        :param name: The name of the derived structure.
+        :param build: A function that builds the structure from the parsed data.
+        :return: The current snapshot and the structure derived from it.
+        """
+        snapshot = self.get()
+        with self.lock:
+            derived = self.derived.get(name)
+            if derived is None or derived[0] is not snapshot:
+                derived = (snapshot, build(snapshot.data))
+                self.derived[name] = derived
+        return derived
+
+    def load(self, stat) -> LayerSnapshot:
+        with open(self.path) as f:
+            data = json.load(f)
+        body = dumps(data)
+        etag = 'W/"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return LayerSnapshot(stat.st_mtime, stat.st_size, etag, email.utils.formatdate(stat.st_mtime, usegmt=True),
+                             data, body, gzip.compress(body, 6),
+                             brotli.compress(body, quality=9) if brotli is not None else None)
+
+
+def is_not_modified(snapshot: LayerSnapshot, if_none_match: str = None, if_modified_since: str = None) -> bool:
+    """
+    Evaluates the conditional request headers against a snapshot, If-None-Match takes precedence when it is present.
+    :param snapshot: The current snapshot of the layer.
+    :param if_none_match: The If-None-Match header of the request.
+    :param if_modified_since: The If-Modified-Since header of the request.
+    :return: True if the client already has the current version.
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or strip_weak(snapshot.etag) in [strip_weak(tag) for tag in tags]
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since is not None and int(snapshot.mtime) <= since.timestamp()
+    return False
+
+
+def strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def choose_encoding(snapshot: LayerSnapshot, accept_encoding: str = None):
+    """
+    Picks the smallest encoding of the snapshot that the client accepts.
+    :param snapshot: The current snapshot of the layer.
+    :param accept_encoding: The Accept-Encoding header of the request.
+    :return: The name of the content encoding, or None for the identity encoding, and the matching body.
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    if snapshot.brotli is not None and "br" in accepted:
+        return "br", snapshot.brotli
+    if "gzip" in accepted:
+        return "gzip", snapshot.gzip
+    return None, snapshot.body
@@ -0,0 +1,249 @@
+import collections
+import json
+import math
+import struct
+import threading
+
+import numpy as np
+from shapely.geometry import box, Point, MultiPoint, LineString, MultiLineString, Polygon, MultiPolygon
+from shapely.geometry.polygon import orient
+from shapely.ops import transform
+
+EXTENT = 4096
+BUFFER = 64
+# Simplification tolerance in tile units, a quarter of a screen pixel for 256 pixel tiles.
+TOLERANCE = EXTENT / 256 / 4
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 24 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: int = 0):
+    """
+    Computes the bounds of a web mercator tile.
+    :param buffer: The number of tile units to extend the bounds with on every side.
+    :return: A tuple of the west, south, east and north bounds in degrees.
+    """
+    n = 2 ** z
+    pad = buffer / EXTENT
+
+    def lon(tx):
+        return tx / n * 360 - 180
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+    return lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad)
+
+
+def to_tile(geometry, z: int, x: int, y: int):
+    """
+    Projects a geometry in degrees to the coordinates of a tile, with the origin at its top left corner.
+    """
+    scale = 2 ** z * EXTENT
+
+    def project(lons, lats, zs=None):
+        lons = np.asarray(lons, dtype=float)
+        lats = np.radians(np.clip(np.asarray(lats, dtype=float), -85.0511, 85.0511))
+        px = (lons + 180) / 360 * scale - x * EXTENT
+        py = (1 - np.log(np.tan(lats) + 1 / np.cos(lats)) / math.pi) / 2 * scale - y * EXTENT
+        return px, py
+    return transform(project, geometry)
+
+
+def zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def command(cid: int, count: int) -> int:
+    return (cid & 0x7) | (count << 3)
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def field(number: int, wire_type: int, payload) -> bytes:
+    """
+    Encodes a protocol buffers field, the payload of length delimited fields must be bytes.
+    """
+    key = varint((number << 3) | wire_type)
+    if wire_type == 0:
+        return key + varint(payload)
+    if wire_type == 1:
+        return key + struct.pack('<d', payload)
+    return key + varint(len(payload)) + payload
+
+
+def packed(number: int, values) -> bytes:
+    return field(number, 2, b"".join(varint(v) for v in values))
+
+
+def rounded(coords):
+    """
+    Rounds coordinates to whole tile units, dropping points that round to their predecessor.
+    """
+    res = []
+    for cx, cy in coords:
+        point = (int(round(cx)), int(round(cy)))
+        if len(res) == 0 or res[-1] != point:
+            res.append(point)
+    return res
+
+
+def encode_geometry(geometry):
+    """
+    Encodes a geometry in tile coordinates to the command integers of the vector tile specification.
+    :return: The vector tile geometry type and the list of command integers, or None if nothing remains to draw.
+    """
+    commands = []
+    cursor = [0, 0]
+
+    def path(points, close):
+        commands.append(command(1, 1))
+        for i, (px, py) in enumerate(points):
+            if i == 1:
+                commands.append(command(2, len(points) - 1))
+            commands.extend((zigzag(px - cursor[0]), zigzag(py - cursor[1])))
+            cursor[0], cursor[1] = px, py
+        if close:
+            commands.append(command(7, 1))
+
+    if isinstance(geometry, (Point, MultiPoint)):
+        points = [rounded(p.coords)[0] for p in getattr(geometry, "geoms", [geometry])]
+        commands.append(command(1, len(points)))
+        for px, py in points:
+            commands.extend((zigzag(px - cursor[0]), zigzag(py - cursor[1])))
+            cursor[0], cursor[1] = px, py
+        return 1, commands
+    if isinstance(geometry, (LineString, MultiLineString)):
+        for line in getattr(geometry, "geoms", [geometry]):
+            points = rounded(line.coords)
+            if len(points) > 1:
+                path(points, False)
+        return (2, commands) if commands else None
+    if isinstance(geometry, (Polygon, MultiPolygon)):
+        for polygon in getattr(geometry, "geoms", [geometry]):
+            polygon = orient(polygon, 1.0)
+            for ring in [polygon.exterior] + list(polygon.interiors):
+                points = rounded(ring.coords)[:-1]
+                if len(points) > 2:
+                    path(points, True)
+        return (3, commands) if commands else None
+    if hasattr(geometry, "geoms"):
+        # Clipping can produce a collection of mixed types, of which the lines, or else polygons or points, are kept.
+        for kinds, multi in (((LineString, MultiLineString), MultiLineString), ((Polygon, MultiPolygon), MultiPolygon),
+                             ((Point, MultiPoint), MultiPoint)):
+            parts = []
+            for part in geometry.geoms:
+                if isinstance(part, kinds):
+                    parts.extend(getattr(part, "geoms", [part]))
+            if parts:
+                return encode_geometry(multi(parts))
+    return None
+
+
+def encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return field(7, 0, int(value))
+    if isinstance(value, int):
+        return field(5, 0, value) if value >= 0 else field(6, 0, zigzag(value))
+    if isinstance(value, float):
+        return field(3, 1, value)
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    return field(1, 2, value.encode("utf-8"))
+
+
+def encode_layer(name: str, features) -> bytes:
+    """
+    Encodes a vector tile layer.
+    :param name: The name of the layer.
+    :param features: A list of geometries in tile coordinates and their properties.
+    :return: The encoded layer message.
+    """
+    keys = {}
+    values = {}
+    encoded = []
+    for geometry, properties in features:
+        result = encode_geometry(geometry)
+        if result is None:
+            continue
+        tags = []
+        for key, value in properties.items():
+            # Nested objects, such as the single route of a delivery, are features of their own and are left out.
+            if value is None or isinstance(value, dict):
+                continue
+            value = encode_value(value)
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        encoded.append(field(2, 2, packed(2, tags) + field(3, 0, result[0]) + packed(4, result[1])))
+    if len(encoded) == 0:
+        return b""
+    return (field(15, 0, 2) + field(1, 2, name.encode("utf-8")) + b"".join(encoded) +
+            b"".join(field(3, 2, key.encode("utf-8")) for key in keys) +
+            b"".join(field(4, 2, value) for value in values) + field(5, 0, EXTENT))
+
+
+def make_tile(layers, z: int, x: int, y: int) -> bytes:
+    """
+    Creates a Mapbox Vector Tile from spatially indexed GeoJSON layers. Geometries are clipped to the tile and its
+    buffer, and simplified to the resolution of the tile.
+    :param layers: A dict of FeatureIndex objects by layer name.
+    :return: The encoded tile, which is empty if no geometry falls inside the tile.
+    """
+    bbox = tile_bounds(z, x, y, BUFFER)
+    clip = box(-BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER)
+    tile = b""
+    for name, feature_index in layers.items():
+        features = []
+        for i in feature_index.query(bbox):
+            geometry = to_tile(feature_index.geometries[i], z, x, y)
+            if not clip.contains(geometry):
+                geometry = geometry.intersection(clip)
+            if geometry.is_empty:
+                continue
+            if not isinstance(geometry, (Point, MultiPoint)):
+                geometry = geometry.simplify(TOLERANCE, preserve_topology=False)
+            features.append((geometry, feature_index.properties[i]))
+        layer = encode_layer(name, features)
+        if layer:
+            tile += field(3, 2, layer)
+    return tile
+
+
+class TileCache:
+    """
+    Least recently used cache of encoded tiles.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tiles = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Retrieves a tile, creating and caching it if it is not cached.
+        :param key: The key of the tile, which must identify the version of the data as well as the tile.
+        :param build: A function without arguments that creates the tile.
+        :return: The encoded tile.
+        """
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+        tile = build()
+        with self.lock:
+            self.tiles[key] = tile
+            while len(self.tiles) > self.size:
+                self.tiles.popitem(last=False)
+        return tile
@@ -0,0 +1,116 @@
+"""
+Generators of synthetic algorithm outputs at a configurable scale, shared by the tests and the benchmarks.
+"""
+from geojson import Feature, Point
+
+from application.models.Depot import Depot
+from application.models.Vehicle import Vehicle
+from application.services.almende_output import from_dict
+
+
+def make_almende_output(vehicle_count, legs, node_count, leg_minutes=10, handover_every=0):
+    """
+    Generates an Almende output in which every vehicle picks up its parcels at the depot and then delivers one parcel
+    at the end of every leg, each leg taking leg_minutes minutes of which the last is spent at the stop.
+    :param handover_every: If not 0, every so many legs end with a handover before the delivery.
+    :return: The output as decoded JSON.
+    """
+    nodes = [{"id": i, "coordinates": {"latitude": 52 + i / 10000, "longitude": 4 + i / 10000},
+              "pickup": int(i == 0), "storage": {"0": []}} for i in range(node_count)]
+    requests = []
+    vehicles = []
+    for v in range(vehicle_count):
+        actions = {}
+        mode = {}
+        stops = [0] + [node_count - 1 - (v * legs + k) % (node_count - 1) for k in range(legs)]
+        for k in range(legs):
+            for minute in range(k * leg_minutes, (k + 1) * leg_minutes - 1):
+                actions[str(minute)] = {"actionType": "TRAVELLING", "duration": leg_minutes - 1, "from": stops[k],
+                                        "to": stops[k + 1]}
+            req = v * legs + k
+            requests.append({"id": req, "origin": 0, "destination": stops[k + 1], "requestTime": 0})
+            nodes[0]["storage"]["0"].append(req)
+            stop = str((k + 1) * leg_minutes - 1)
+            if k == 0:
+                actions[stop] = {"actionType": "PICKUP", "duration": 1,
+                                 "relatedRequests": list(range(v * legs, (v + 1) * legs))}
+            elif handover_every and k % handover_every == 0:
+                actions[stop] = [{"actionType": "HANDOVER", "duration": 1, "relatedRequests": [req]},
+                                 {"actionType": "DELIVER", "duration": 1, "relatedRequests": [req]}]
+            else:
+                actions[stop] = {"actionType": "DELIVER", "duration": 1, "relatedRequests": [req]}
+        for minute in range(len(actions)):
+            mode[str(minute)] = "Manual"
+        vehicles.append({"id": v, "mode": mode, "startingLocation": 0, "actions": actions})
+    return {"nodes": nodes, "vehicles": vehicles, "requests": requests, "totalcost": 1.0}
+
+
+def make_almende_data(vehicle_count, legs, node_count, **kwargs):
+    """
+    Generates an Almende output as with make_almende_output, converted to an AlmendeOutput object.
+    """
+    return from_dict(make_almende_output(vehicle_count, legs, node_count, **kwargs))
+
+
+def encode_polyline(coordinates):
+    """
+    Encodes coordinates in the polyline format of ORS, the inverse of openrouteservice.convert.decode_polyline.
+    """
+    def encode_value(value):
+        value = ~(value << 1) if value < 0 else value << 1
+        res = ''
+        while value >= 0x20:
+            res += chr((0x20 | (value & 0x1f)) + 63)
+            value >>= 5
+        return res + chr(value + 63)
+
+    res = ''
+    prev_lat = prev_lon = 0
+    for lon, lat in coordinates:
+        lat, lon = int(round(lat * 1e5)), int(round(lon * 1e5))
+        res += encode_value(lat - prev_lat) + encode_value(lon - prev_lon)
+        prev_lat, prev_lon = lat, lon
+    return res
+
+
+def make_ors_optimization(vehicle_count, jobs_per_vehicle, depot_count=1):
+    """
+    Generates an ORS optimization response in which every vehicle visits its own jobs and returns to its depot.
+    :return: The response, and the vehicles and depots it was computed for.
+    """
+    depots = [Depot(id=d + 1, latitude=51.9 + d / 100, longitude=4.4 + d / 100) for d in range(depot_count)]
+    vehicles = [Vehicle(id=v + 1, depot=v % depot_count + 1, capacity=jobs_per_vehicle) for v in range(vehicle_count)]
+    routes = []
+    for vehicle in vehicles:
+        depot = [depots[vehicle.depot - 1].longitude, depots[vehicle.depot - 1].latitude]
+        steps = [{"type": "start", "location": depot, "arrival": 0, "distance": 0}]
+        for j in range(jobs_per_vehicle):
+            job = (vehicle.id - 1) * jobs_per_vehicle + j
+            location = [round(4.2 + (job * 7919 % 3000) / 10000, 5), round(51.9 + (job * 104729 % 2000) / 10000, 5)]
+            steps.append({"type": "job", "job": job, "location": location, "arrival": 300 * (j + 1),
+                          "distance": 1000.0 * (j + 1)})
+        steps.append({"type": "end", "location": depot, "arrival": 300 * (jobs_per_vehicle + 1),
+                      "distance": 1000.0 * (jobs_per_vehicle + 1)})
+        routes.append({"vehicle": vehicle.id, "geometry": encode_polyline([step["location"] for step in steps]),
+                       "duration": steps[-1]["arrival"], "distance": steps[-1]["distance"], "steps": steps})
+    return {"routes": routes}, vehicles, depots
+
+
+def fake_directions(coordinate_list):
+    """
+    Replaces ors_directions with a straight line through the coordinates.
+    """
+    coordinates = [list(c) for c in coordinate_list]
+    return 100.0, coordinates, [{"distance": 10.0} for i in range(len(coordinates))]
+
+
+def make_handover_features(deliveries, handovers):
+    """
+    Generates delivery features and handover features that each involve two of the deliveries.
+    """
+    features = [Feature(geometry=Point((4.0, 52.0)), properties={"type": "delivery", "number": i, "handovers": []})
+                for i in range(deliveries)]
+    features += [Feature(geometry=Point((4.0, 52.0 + i / 10000)),
+                         properties={"type": "handover", "involved": [i % deliveries, (i * 7) % deliveries]})
+                 for i in range(handovers)]
+    return features
@@ -0,0 +1,38 @@
+import json
+
+from application.services.almende_output import from_dict, read_almende, Runs
+
+ASSET = './application/assets/delayed_output.json'
+
+
+def test_read_almende():
+    with open(ASSET, 'rb') as f:
+        streamed = read_almende(f)
+    with open(ASSET) as f:
+        data = json.load(f)
+    decoded = from_dict(data)
+
+    assert streamed.totalcost == data["totalcost"]
+    assert [node.id for node in streamed.nodes] == [node["id"] for node in data["nodes"]]
+    assert streamed.requests == decoded.requests
+    for vehicle, raw in zip(streamed.vehicles, data["vehicles"]):
+        assert vehicle.actions.length == len(raw["actions"])
+        for minute, action in raw["actions"].items():
+            # The flags that the conversion to GeoJSON does not use are not kept.
+            rows = [row for row in vehicle.actions.rows() if row["minute"] == int(minute)]
+            assert rows == [dict({k: v for k, v in a.items() if k not in ("completed", "startsNow", "toDepot")},
+                                 minute=int(minute)) for a in (action if type(action) == list else [action])]
+        assert all(vehicle.modes.get(int(minute)) == mode for minute, mode in raw["mode"].items())
+    for node, raw in zip(streamed.nodes, data["nodes"]):
+        assert all(node.storage.get(int(minute)) == parcels for minute, parcels in raw["storage"].items())
+        # Storage only changes now and then, so it is kept as a few runs instead of a value per minute.
+        assert len(node.storage.values) <= 10
+
+
+def test_runs():
+    runs = Runs({"0": "Manual", "1": "Manual", "4": "Autonomous", "5": "Manual"})
+
+    assert runs.values == ["Manual", None, "Autonomous", "Manual"]
+    assert [runs.get(minute) for minute in range(7)] == ["Manual", "Manual", None, None, "Autonomous", "Manual", None]
+    assert runs.get(3, "Unknown") == "Unknown"
+    assert Runs({}).get(0, []) == []
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from application.models.Depot import Depot
+from application.models.Scenario import Scenario
+from application.services.asset_store import AssetStore, freeze
+from application.services.result_cache import canonical_key
+from application.dependencies.data_dependencies import read_depots
+
+
+def write_depots(path, rows):
+    with open(path, "w") as f:
+        f.write("ID,Lat,Lon\n")
+        for i, (lat, lon) in enumerate(rows, 1):
+            f.write(str(i) + "," + str(lat) + "," + str(lon) + "\n")
+
+
+def test_reload_on_change(tmp_path):
+    store = AssetStore()
+    path = str(tmp_path / "depots.csv")
+    write_depots(path, [(51.9, 4.4)])
+
+    first = store.get(path, read_depots)
+    assert store.get(path, read_depots) is first
+    assert isinstance(first, tuple) and first[0].latitude == 51.9
+
+    write_depots(path, [(52.0, 4.5), (52.1, 4.6)])
+    second = store.get(path, read_depots)
+
+    assert [d.latitude for d in second] == [52.0, 52.1]
+    assert store.snapshot()[os.path.abspath(path)] == (1, 2)
+
+
+def test_invalidate(tmp_path):
+    store = AssetStore()
+    path = str(tmp_path / "depots.csv")
+    write_depots(path, [(51.9, 4.4)])
+    first = store.get(path, read_depots)
+    stat = os.stat(path)
+
+    write_depots(path, [(51.8, 4.4)])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert store.get(path, read_depots) is first
+
+    store.invalidate(path)
+    assert store.get(path, read_depots)[0].latitude == 51.8
+
+
+def test_models_are_frozen(tmp_path):
+    store = AssetStore()
+    path = str(tmp_path / "depots.csv")
+    write_depots(path, [(51.9, 4.4)])
+    depot = store.get(path, read_depots)[0]
+
+    with pytest.raises(TypeError):
+        depot.latitude = 0
+    assert isinstance(depot, Depot) and depot == Depot(id=1, latitude=51.9, longitude=4.4)
+    assert store.get(path, read_depots)[0].latitude == 51.9
+
+
+def test_freeze_nested():
+    original = Scenario.read_from_file('./application/assets/sample_scenario.txt')
+    scenario = freeze(original)
+
+    with pytest.raises(TypeError):
+        scenario.parcels[0].request_time = 0
+    with pytest.raises(AttributeError):
+        scenario.parcels.append(None)
+    assert isinstance(scenario, Scenario) and canonical_key(scenario) == canonical_key(original)
@@ -1,9 +1,19 @@
+import json
+import os
+
 from fastapi.testclient import TestClient
 
 from application.main import app
+from application.services import autonomous_roads
+from application.services.autonomous_roads import SegmentGrid
+from application.services.static_layer import StaticLayer
 
 client = TestClient(app)
 
+ROADS = {"type": "FeatureCollection", "features": [
+    {"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[4.4, 52.0], [4.5, 52.1]]},
+     "properties": {"maxspeed": "100"}}]}
+
 # TODO: more tests
 
 
@@ -13,3 +23,74 @@ def test_get_geojson():
     assert response.status_code == 200
     assert response.json() is not None
     assert response.json() != {}
+
+
+def test_get_geojson_conditional(tmp_path, monkeypatch):
+    path = tmp_path / "roads.geojson"
+    path.write_text(json.dumps(ROADS))
+    monkeypatch.setattr(autonomous_roads, "roads", StaticLayer(str(path)))
+
+    response = client.get("/autonomous/geojson", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == ROADS
+
+    etag = response.headers["etag"]
+    assert client.get("/autonomous/geojson", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/autonomous/geojson",
+                      headers={"If-Modified-Since": response.headers["last-modified"]}).status_code == 304
+
+    changed = json.loads(json.dumps(ROADS))
+    changed["features"][0]["properties"]["maxspeed"] = "130"
+    path.write_text(json.dumps(changed))
+    os.utime(str(path), (os.path.getmtime(str(path)) + 10,) * 2)
+    response = client.get("/autonomous/geojson", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["features"][0]["properties"]["maxspeed"] == "130"
+
+
+def test_get_tile(tmp_path, monkeypatch):
+    path = tmp_path / "roads.geojson"
+    path.write_text(json.dumps(ROADS))
+    monkeypatch.setattr(autonomous_roads, "roads", StaticLayer(str(path)))
+
+    response = client.get("/autonomous/tiles/10/524/337")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert b"roads" in response.content
+    assert client.get("/autonomous/tiles/10/0/0").content == b""
+    assert client.get("/autonomous/tiles/1/2/0").status_code == 404
+
+
+def test_query(tmp_path, monkeypatch):
+    path = tmp_path / "roads.geojson"
+    path.write_text(json.dumps(ROADS))
+    monkeypatch.setattr(autonomous_roads, "roads", StaticLayer(str(path)))
+
+    response = client.get("/autonomous/query", params={"bbox": "4.44,52.0,4.46,52.1"})
+    assert response.status_code == 200
+    assert response.json()["features"] == ROADS["features"]
+    # The bounding boxes overlap, but the road passes the box at a distance.
+    assert client.get("/autonomous/query", params={"bbox": "4.4,52.08,4.41,52.1"}).json()["features"] == []
+    assert client.get("/autonomous/query", params={"bbox": "4.5,52.0,4.4,52.1"}).status_code == 400
+    assert client.get("/autonomous/query", params={"bbox": "4.4,52.0"}).status_code == 400
+    assert client.get("/autonomous/query", params={"bbox": "a,b,c,d"}).status_code == 400
+
+
+def test_autonomous_segments():
+    grid = SegmentGrid(ROADS["features"], 25)
+    # Along the road, then a detour away from it, then back on the road.
+    route = [[4.4, 52.0], [4.42, 52.02], [4.44, 52.04], [4.44, 52.06], [4.46, 52.06], [4.48, 52.08], [4.5, 52.1]]
+    assert grid.runs(route) == [[0, 2], [4, 6]]
+    assert grid.runs([[4.4001, 52.0], [4.5001, 52.1]]) == [[0, 1]]
+    assert grid.runs([[4.41, 52.0], [4.51, 52.1]]) == []
+    assert grid.runs([[4.4, 52.0]]) == []
+
+
+def test_autonomous_tolerance():
+    grid = SegmentGrid([{"geometry": {"type": "LineString", "coordinates": [[4.4, 52.0], [4.5, 52.0]]}}], 25)
+    # Points at 20 and 30 metres north of the road, and beyond its end.
+    assert grid.contains([[4.45, 52.0 + 20 / 110540], [4.45, 52.0 + 30 / 110540]]).tolist() == [True, False]
+    assert grid.contains([[4.5005, 52.0], [4.5, 52.0 + 24 / 110540], [4.4, 52.0 - 26 / 110540]]).tolist() == \
+        [False, True, False]
+    assert SegmentGrid([], 25).contains([[4.45, 52.0]]).tolist() == [False]
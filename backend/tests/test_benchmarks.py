@@ -0,0 +1,165 @@
+"""
+Benchmarks of the map conversion pipeline on synthetic outputs and delayed_output.json, with ors_directions replaced
+by a local stub.
+They measure wall-clock time, which depends on the load of the machine, so they only run with BENCHMARK=1.
+
+Every benchmark is timed relative to a fixed reference workload, so that the baselines in benchmarks.json hold on
+other machines, and fails when it is more than BENCHMARK_TOLERANCE times slower than its baseline. BENCHMARK_SCALE
+multiplies the number of vehicles, which skips the comparison, and BENCHMARK_SAVE=1 records new baselines.
+The scaling tests instead compare the time of a workload with that of a larger one on the same machine.
+"""
+import gc
+import io
+import json
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from application.models.Route import ORSResult
+from application.routes import map
+from application.services.almende_output import read_almende
+from application.services.fast_json import dumps
+from synthetic import make_almende_output, make_almende_data, make_ors_optimization, fake_directions, \
+    make_handover_features
+
+BASELINES = os.path.join(os.path.dirname(__file__), "benchmarks.json")
+SCALE = int(os.environ.get("BENCHMARK_SCALE", "1"))
+TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", "2.5"))
+SAVE = os.environ.get("BENCHMARK_SAVE") == "1"
+
+pytestmark = pytest.mark.skipif(os.environ.get("BENCHMARK") != "1", reason="benchmarks only run with BENCHMARK=1")
+
+
+def reference():
+    data = [{"number": i, "coordinates": [i / 10, i / 20]} for i in range(20000)]
+    return sum(ft["coordinates"][1] for ft in data if ft["number"] % 3)
+
+
+def best_time(function, rounds, setup=None):
+    """
+    :param setup: An optional function that creates the argument of function anew for every round, untimed.
+    """
+    best = None
+    for i in range(rounds):
+        arguments = () if setup is None else (setup(),)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function(*arguments)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@pytest.fixture(scope="module")
+def benchmark():
+    reference_time = best_time(reference, 5)
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    results = {}
+
+    def run(name, function, rounds=3):
+        relative = best_time(function, rounds) / reference_time
+        results[name] = round(relative, 2)
+        if not SAVE and SCALE == 1 and name in baselines:
+            assert relative <= baselines[name] * TOLERANCE, \
+                name + " takes " + str(round(relative, 2)) + " reference runs, baseline " + str(baselines[name])
+        return relative
+
+    yield run
+    if SAVE:
+        baselines.update(results)
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+@pytest.fixture(autouse=True)
+def local_directions(monkeypatch):
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+
+
+def test_benchmark_read_almende(benchmark):
+    encoded = json.dumps(make_almende_output(20 * SCALE, 20, 2000, handover_every=4)).encode("utf-8")
+
+    benchmark("read_almende", lambda: read_almende(io.BytesIO(encoded)))
+
+
+def test_benchmark_iterate_actions(benchmark):
+    data = make_almende_data(20 * SCALE, 20, 2000, handover_every=4)
+    lookup = map.make_lookup(data)
+
+    def iterate():
+        depots = map.get_depot_list(data.nodes)
+        for num, vehicle in enumerate(data.vehicles, 1):
+            map.iterate_actions(num, depots, vehicle, lookup, 499)
+
+    benchmark("iterate_actions", iterate)
+
+
+def test_benchmark_almende_geojson(benchmark):
+    data = make_almende_data(20 * SCALE, 20, 2000, handover_every=4)
+
+    benchmark("make_almende_geojson", lambda: map.make_almende_geojson(data))
+
+
+def test_almende_geojson_scales_linearly():
+    small_data = make_almende_data(10, 20, 1000)
+    large_data = make_almende_data(40, 20, 4000)
+
+    small = best_time(lambda: map.make_almende_geojson(small_data), 3)
+    large = best_time(lambda: map.make_almende_geojson(large_data), 3)
+
+    # Four times the actions and nodes should take about four times as long, a quadratic conversion takes sixteen.
+    assert large / small < 6
+
+
+def test_add_handovers_to_deliveries_scales_linearly():
+    # The features are created for every round, since the handovers are added to them.
+    small = best_time(map.add_handovers_to_deliveries, 5, lambda: make_handover_features(2500, 1250))
+    large = best_time(map.add_handovers_to_deliveries, 5, lambda: make_handover_features(10000, 5000))
+
+    assert large / small < 8
+
+
+def test_benchmark_ors_geojson(benchmark):
+    optimization, vehicles, depots = make_ors_optimization(20 * SCALE, 25, 3)
+
+    benchmark("make_ors_geojson", lambda: map.make_ors_geojson(optimization, vehicles, depots))
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_fast_serialization_beats_validation():
+    with open('./application/assets/delayed_output.json', 'rb') as f:
+        result = {'geojson': map.make_almende_geojson(read_almende(f))}
+
+    def validate():
+        return ORSResult(**result).json()
+
+    def encode():
+        return dumps(result)
+
+    # Memory is traced separately, since tracing slows down the many allocations of validation far more.
+    assert best_time(encode, 5) < best_time(validate, 5)
+    assert peak_memory(encode) < peak_memory(validate)
+
+
+def test_benchmark_serialization(benchmark):
+    result = {'geojson': map.make_almende_geojson(make_almende_data(20 * SCALE, 20, 2000, handover_every=4))}
+
+    benchmark("serialization", lambda: dumps(result))
@@ -0,0 +1,118 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from application.main import app
+from application.routes import map
+from application.services.delivery_upload import DeliveryStore, UploadError, parse_deliveries
+from application.services.result_cache import canonical_key
+
+client = TestClient(app)
+
+CSV = b"ID,Lat,Lon,Needed_Amount\n1,51.92,4.45,1\n2,51.93,4.46,2\n3,51.94,4.47,1\n"
+
+
+def test_parse_csv():
+    table = parse_deliveries(CSV, "text/csv; charset=utf-8")
+
+    assert len(table) == 3
+    assert [(d.id, d.latitude, d.longitude, d.needed_amt) for d in table][1] == (2, 51.93, 4.46, 2)
+    assert table.handle == parse_deliveries(CSV.replace(b"ID,Lat", b"id,latitude"), "text/csv").handle
+    assert canonical_key(table) == canonical_key(parse_deliveries(CSV, "text/csv"))
+
+
+def test_validation_reports_rows():
+    body = b"ID,Lat,Lon,Needed_Amount\n1,91,4.45,1\n2,51.93,4.46,0\n2,51.94,x,1\n"
+
+    with pytest.raises(UploadError) as error:
+        parse_deliveries(body, "text/csv")
+
+    message = str(error.value)
+    assert "2 rows share their ID" in message
+    assert "1 rows have a latitude" in message and "(ID 1)" in message
+    assert "1 rows have a longitude" in message
+    assert "1 rows have a needed amount" in message
+
+
+def test_large_ids_are_exact():
+    body = b"ID,Lat,Lon,Needed_Amount\n9007199254740993,51.92,4.45,1\n9007199254740992,51.93,4.46,1\n"
+
+    table = parse_deliveries(body, "text/csv")
+
+    assert [d.id for d in table] == [9007199254740993, 9007199254740992]
+    for ids in (b"9007199254740993.0", b"18446744073709551615", b"1.5"):
+        with pytest.raises(UploadError, match="1 rows have an ID that is not an integer"):
+            parse_deliveries(body.replace(b"9007199254740993", ids).replace(b"9007199254740992", b"7"), "text/csv")
+
+
+def test_parse_parquet_and_arrow():
+    pa = pytest.importorskip("pyarrow")
+    frame = pd.read_csv(io.BytesIO(CSV))
+    parquet = io.BytesIO()
+    frame.to_parquet(parquet)
+    sink = pa.BufferOutputStream()
+    writer = pa.ipc.new_file(sink, pa.Schema.from_pandas(frame))
+    writer.write_table(pa.Table.from_pandas(frame))
+    writer.close()
+
+    expected = parse_deliveries(CSV, "text/csv").handle
+    assert parse_deliveries(parquet.getvalue(), "application/vnd.apache.parquet").handle == expected
+    assert parse_deliveries(sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.file").handle == expected
+
+
+def test_store_evicts_least_recently_used():
+    store = DeliveryStore(6)
+    tables = [parse_deliveries(CSV.replace(b"51.92", str(52 + i).encode()), "text/csv") for i in range(3)]
+    store.put(tables[0])
+    store.put(tables[1])
+    store.get(tables[0].handle)
+    store.put(tables[2])
+
+    assert store.get(tables[1].handle) is None
+    assert store.get(tables[0].handle) is tables[0]
+
+
+def test_upload_and_reference(monkeypatch):
+    requested = []
+
+    def ors_request(deliveries, vehicles, depots):
+        requested.append(list(deliveries))
+        return {"routes": []}
+
+    monkeypatch.setattr(map, "ors_request", ors_request)
+    map.result_cache.clear()
+    ids = np.arange(1, 1001)
+    body = pd.DataFrame({"ID": ids, "Lat": 51.9 + ids / 1e5, "Lon": 4.4, "Needed_Amount": 1}).to_csv(index=False)
+
+    response = client.post("/map/deliveries", data=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 201
+    assert response.json()["count"] == 1000
+
+    response = client.post("/map/geojson", params={"algorithm": 0, "deliveries_handle": response.json()["handle"]})
+    assert response.status_code == 200
+    assert [d.id for d in requested[0]] == list(range(1, 1001))
+
+    assert client.post("/map/geojson", params={"algorithm": 0, "deliveries_handle": "missing"}).status_code == 404
+    assert client.post("/map/deliveries", data=b"{}", headers={"Content-Type": "application/json"}).status_code == 415
+    assert client.post("/map/deliveries", data=b"ID,Lat\n1,2\n", headers={"Content-Type": "text/csv"}).status_code \
+        == 422
+
+
+def test_upload_limits(monkeypatch):
+    monkeypatch.setattr(map.settings, "DELIVERY_UPLOAD_MAX_BYTES", len(CSV) - 1)
+
+    assert client.post("/map/deliveries", data=CSV, headers={"Content-Type": "text/csv"}).status_code == 413
+    chunked = client.post("/map/deliveries", data=iter([CSV[:20], CSV[20:]]), headers={"Content-Type": "text/csv"})
+    assert chunked.status_code == 413
+
+    monkeypatch.setattr(map.settings, "DELIVERY_UPLOAD_MAX_BYTES", len(CSV))
+    handle = client.post("/map/deliveries", data=CSV, headers={"Content-Type": "text/csv"}).json()["handle"]
+    delivery = {"id": 1, "latitude": 51.92, "longitude": 4.45, "needed_amt": 1}
+    response = client.post("/map/geojson", params={"algorithm": 0, "deliveries_handle": handle},
+                           json={"deliveries": [delivery]})
+    assert response.status_code == 422
+    with pytest.raises(TypeError):
+        map.uploads.get(handle)[0].needed_amt = 2
@@ -0,0 +1,76 @@
+import json
+
+from application.services import directions_cache
+from application.services.directions_cache import DirectionsCache
+
+ROUTE = (1234.5, [[4.45, 51.92], [4.46, 51.93]], [{"distance": 1234.5, "duration": 100.0}])
+SIZE = len(json.dumps(ROUTE))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = DirectionsCache(2 * SIZE)
+    keys = [cache.key('driving-car', [[4.45, 51.92], [4.46, 51.93 + i]]) for i in range(3)]
+    cache.put(keys[0], ROUTE)
+    cache.put(keys[1], ROUTE)
+    cache.get(keys[0])
+    cache.put(keys[2], ROUTE)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == ROUTE
+    assert cache.stats() == {"hits": 2, "disk_hits": 0, "misses": 1, "size": 2, "bytes": 2 * SIZE}
+
+
+def test_key_is_canonical():
+    cache = DirectionsCache(2)
+
+    assert cache.key('driving-car', [(4.45, 51.92)]) == cache.key('driving-car', [[4.4500000001, 51.92]])
+    assert cache.key('driving-car', [(4.45, 51.92)]) != cache.key('cycling-regular', [(4.45, 51.92)])
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "directions.sqlite")
+    cache = DirectionsCache(2 * SIZE, path, 2 * SIZE)
+    keys = [cache.key('driving-car', [[4.45, 51.92 + i]]) for i in range(3)]
+    for key in keys:
+        cache.put(key, ROUTE)
+
+    restarted = DirectionsCache(2 * SIZE, path, 2 * SIZE)
+
+    assert restarted.get(keys[0]) is None
+    assert restarted.get(keys[2]) == ROUTE
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_tiers_are_bounded_by_size(tmp_path):
+    cache = DirectionsCache(3 * SIZE, str(tmp_path / "directions.sqlite"), 3 * SIZE)
+    keys = [cache.key('driving-car', [[4.45, 51.92 + i]]) for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, ROUTE)
+    large = (1234.5, [[4.45, 51.92]] * 40, [])
+    cache.put(keys[3], large)
+
+    assert cache.stats()["size"] == 1 and cache.stats()["bytes"] == len(json.dumps(large))
+    assert [cache.get(key) is None for key in keys] == [True, True, True, False]
+
+
+def test_disk_hits_write_once_per_interval(tmp_path, monkeypatch):
+    now = [960.0]
+    monkeypatch.setattr(directions_cache.time, "time", lambda: now[0])
+    path = str(tmp_path / "directions.sqlite")
+    key = DirectionsCache(SIZE).key('driving-car', [[4.45, 51.92]])
+    DirectionsCache(SIZE, path, SIZE, interval=60).put(key, ROUTE)
+
+    cache = DirectionsCache(SIZE, path, SIZE, interval=60)
+    cache.get(key)
+    changes = cache.connection.total_changes
+    # Only the disk tier is tested.
+    cache.memory.clear()
+    now[0] += 30
+    cache.get(key)
+    assert cache.connection.total_changes == changes
+    cache.memory.clear()
+    now[0] += 60
+    cache.get(key)
+    assert cache.connection.total_changes == changes + 1
+    assert cache.stats()["disk_hits"] == 3
+
@@ -1,13 +1,210 @@
+import json
+import threading
+import time
+
+import pytest
 from fastapi.testclient import TestClient
 
 from application.main import app
+from application.models.Route import ORSResult
+from application.routes import map
+from application.services.almende_output import read_almende
+from application.services.fast_json import dumps
+from application.services.jobs import JobQueue
+from synthetic import make_almende_data, make_ors_optimization, fake_directions, make_handover_features
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    # Tests replace the algorithms, which the result cache does not know about.
+    map.result_cache.clear()
+
+
 def test_get_geojson():
     response = client.post(url="/map/geojson", params={"algorithm": 0}, json={})
 
     assert response.status_code == 200
     assert response.json() is not None
     assert response.json() != {}
+
+
+def test_timeline_queries():
+    vehicle = make_almende_data(1, 3, 10).vehicles[0]
+    timeline = map.make_timeline(vehicle)
+
+    assert timeline.minutes == [m for m in range(30) if m % 10 != 9]
+    assert map.get_nearest_node(timeline, 9) == timeline.origins[9]
+    assert map.get_last_node(timeline, 9) == timeline.targets[8]
+    assert map.get_prev_mode(timeline, 0) is None
+    assert map.get_next_mode(timeline, 29) is None
+    assert vehicle.modes.values == ["Manual"]
+
+
+def test_directions_batch_coalesces_requests(monkeypatch):
+    calls = []
+
+    def counting_directions(coordinate_list):
+        calls.append(coordinate_list)
+        return fake_directions(coordinate_list)
+
+    monkeypatch.setattr(map, "ors_directions", counting_directions)
+    a = [(4.1, 52.1), (4.2, 52.2)]
+    b = [(4.3, 52.3), (4.4, 52.4)]
+
+    res = map.directions_batch([a, b, list(a), a])
+
+    assert len(calls) == 2
+    assert [r[1] for r in res] == [[list(c) for c in a], [list(c) for c in b]] + [[list(c) for c in a]] * 2
+
+
+def test_delivery_waypoints_share_history(monkeypatch):
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+    data = make_almende_data(1, 4, 10)
+
+    features = map.make_almende_geojson(data)["features"]
+    deliveries = [ft for ft in features if ft.properties["type"] == "delivery"]
+
+    assert [len(ft.properties["waypoints"]) for ft in deliveries] == [1, 2, 3]
+    assert deliveries[2].properties["waypoints"][:2] == deliveries[1].properties["waypoints"]
+
+
+def test_add_handovers_to_deliveries():
+    features = map.add_handovers_to_deliveries(make_handover_features(10, 5))
+    assert [len(ft.properties["handovers"]) for ft in features[:10]] == [1, 2, 1, 1, 2, 0, 0, 1, 1, 0]
+
+
+class ScanCounter(list):
+    """
+    A list that counts how often it is iterated over.
+    """
+    scans = 0
+
+    def __iter__(self):
+        self.scans += 1
+        return super().__iter__()
+
+
+def test_add_handovers_to_deliveries_scans_twice():
+    # Indexing the handovers and adding them each take one pass over the features, however many there are, where
+    # looking up the handovers of every delivery would take a pass per delivery.
+    for deliveries in (10, 1000):
+        features = ScanCounter(make_handover_features(deliveries, deliveries // 2))
+        map.add_handovers_to_deliveries(features)
+        assert features.scans == 2
+
+
+def test_get_geojson_stream(monkeypatch):
+    monkeypatch.setattr(map, "almende_request", lambda scenario: make_almende_data(2, 3, 10))
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+
+    response = client.post(url="/map/geojson", params={"algorithm": 1, "stream": True}, json={})
+    features = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [ft["properties"]["type"] for ft in features].count("route") == 2
+    assert features[-1]["properties"]["type"] == "depot"
+
+
+def test_fast_serialization(monkeypatch):
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+    with open('./application/assets/delayed_output.json', 'rb') as f:
+        result = {'geojson': map.make_almende_geojson(read_almende(f))}
+
+    fast = json.loads(dumps(result))["geojson"]
+    validated = json.loads(ORSResult(**result).json())["geojson"]
+    assert fast["features"] == validated["features"]
+
+
+def test_get_tile(monkeypatch):
+    monkeypatch.setattr(map, "almende_request", lambda scenario: make_almende_data(2, 3, 10))
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+
+    response = client.post(url="/map/geojson", params={"algorithm": 1}, json={})
+    tile = client.get("/map/tiles/" + response.headers["x-result-id"] + "/10/523/338")
+
+    assert tile.status_code == 200
+    assert b"routes" in tile.content and b"stops" in tile.content
+    assert client.get("/map/tiles/unknown/10/523/337").status_code == 404
+
+
+def test_result_cache(monkeypatch):
+    calls = []
+
+    def counting_request(scenario):
+        calls.append(scenario)
+        return make_almende_data(2, 3, 10)
+
+    monkeypatch.setattr(map, "almende_request", counting_request)
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+
+    first = client.post(url="/map/geojson", params={"algorithm": 1}, json={})
+    second = client.post(url="/map/geojson", params={"algorithm": 1}, json={})
+    streamed = client.post(url="/map/geojson", params={"algorithm": 1, "stream": True}, json={})
+
+    assert len(calls) == 1
+    assert second.content == first.content
+    assert second.headers["x-result-id"] == first.headers["x-result-id"]
+    assert [json.loads(line) for line in streamed.text.splitlines()] == first.json()["geojson"]["features"]
+
+    scenario = calls[0].dict()
+    scenario["vehicles"] += 1
+    client.post(url="/map/geojson", params={"algorithm": 1}, json={"scenario": scenario})
+    assert len(calls) == 2
+
+
+def test_jobs(monkeypatch):
+    monkeypatch.setattr(map, "almende_request", lambda scenario: make_almende_data(2, 3, 10))
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+
+    response = client.post(url="/map/jobs", params={"algorithm": 1}, json={})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    for i in range(100):
+        status = client.get("/map/jobs/" + job_id).json()
+        if status["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+
+    assert status["status"] == "done"
+    assert status["progress"] == {"done": 2, "total": 2}
+    result = client.get("/map/jobs/" + job_id + "/result")
+    assert result.json() == client.post(url="/map/geojson", params={"algorithm": 1}, json={}).json()
+    assert client.get("/map/jobs/unknown").status_code == 404
+    assert client.post(url="/map/jobs", params={"algorithm": 5}, json={}).status_code == 400
+
+
+def test_jobs_backpressure(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(map, "job_queue", JobQueue(1, 1, 10))
+    monkeypatch.setattr(map, "compute_result", lambda *args: release.wait())
+
+    first = client.post(url="/map/jobs", params={"algorithm": 1}, json={})
+    second = client.post(url="/map/jobs", params={"algorithm": 1}, json={})
+    assert client.get("/map/jobs/" + first.json()["id"] + "/result").status_code == 409
+    release.set()
+
+    assert second.status_code == 503
+    assert second.headers["retry-after"] == str(map.settings.JOB_RETRY_AFTER)
+
+
+def test_ors_single_routes_from_vehicle_route(monkeypatch):
+    def no_directions(coordinate_list):
+        raise AssertionError("The routes of deliveries are taken from the route of the vehicle.")
+
+    monkeypatch.setattr(map, "ors_directions", no_directions)
+    optimization, vehicles, depots = make_ors_optimization(2, 4)
+
+    features = map.make_ors_geojson(optimization, vehicles, depots)["features"]
+    deliveries = [ft for ft in features if ft.properties["type"] == "delivery"]
+    steps = [step for route in optimization["routes"] for step in route["steps"] if step["type"] == "job"]
+
+    assert len(deliveries) == 8
+    for ft, step in zip(deliveries, steps):
+        route = ft.properties["single_route"]
+        assert route.properties["distance"] == step["distance"]
+        assert route.geometry["coordinates"][0] == pytest.approx([depots[0].longitude, depots[0].latitude], abs=1e-5)
+        assert route.geometry["coordinates"][-1] == pytest.approx(step["location"], abs=1e-5)
+    assert len(deliveries[3].properties["single_route"].geometry["coordinates"]) == 5
@@ -0,0 +1,91 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from application.main import app
+from application.models.Scenario import Scenario
+from application.routes import map
+from application.services import metrics
+from synthetic import make_almende_data, fake_directions
+
+client = TestClient(app)
+
+
+def get_sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_get_metrics(monkeypatch):
+    # The real, decorated almende_request runs, only the scenario file and the algorithm output are replaced.
+    monkeypatch.setattr(Scenario, "write_to_file", lambda self: "./application/assets/sample_scenario.txt")
+    monkeypatch.setattr(map, "read_almende", lambda f: make_almende_data(2, 3, 10))
+    monkeypatch.setattr(map, "ors_directions", fake_directions)
+    map.result_cache.clear()
+    converted = get_sample("backend_stage_seconds_count", stage="make_almende_geojson")
+    requested = get_sample("backend_stage_seconds_count", stage="almende_request")
+    misses = get_sample("backend_cache_lookups_total", cache="results", result="miss")
+    hits = get_sample("backend_cache_lookups_total", cache="results", result="hit")
+
+    client.post(url="/map/geojson", params={"algorithm": 1}, json={})
+    client.post(url="/map/geojson", params={"algorithm": 1}, json={})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'backend_stage_seconds_bucket{le="0.005",stage="almende_request"}' in response.text
+    assert 'backend_request_seconds_count{handler="map.get_geojson",status="200"}' in response.text
+    assert get_sample("backend_stage_seconds_count", stage="make_almende_geojson") == converted + 1
+    assert get_sample("backend_stage_seconds_count", stage="almende_request") == requested + 1
+    assert get_sample("backend_cache_lookups_total", cache="results", result="miss") == misses + 1
+    assert get_sample("backend_cache_lookups_total", cache="results", result="hit") == hits + 1
+    # The request for the metrics itself is in flight.
+    assert "backend_requests_in_flight 1.0" in response.text
+
+
+def test_streaming_request_is_timed_until_sent(monkeypatch):
+    def slow_directions(coordinate_list):
+        time.sleep(0.05)
+        return fake_directions(coordinate_list)
+
+    monkeypatch.setattr(map, "almende_request", lambda scenario: make_almende_data(2, 3, 10))
+    monkeypatch.setattr(map, "ors_directions", slow_directions)
+    map.result_cache.clear()
+    labels = {"handler": "map.get_geojson", "status": "200"}
+    seconds = get_sample("backend_request_seconds_sum", **labels)
+    converted = get_sample("backend_stage_seconds_count", stage="make_almende_geojson")
+
+    response = client.post(url="/map/geojson", params={"algorithm": 1, "stream": True}, json={})
+
+    assert response.status_code == 200
+    # The routes are computed while the body is streamed, after the handler has returned.
+    assert get_sample("backend_request_seconds_sum", **labels) - seconds >= 0.05
+    assert get_sample("backend_stage_seconds_count", stage="make_almende_geojson") == converted + 1
+    assert get_sample("backend_requests_in_flight") == 0
+
+
+def test_timed_generator():
+    stage = {"stage": "test_generator"}
+    count = get_sample("backend_stage_seconds_count", **stage)
+    seconds = get_sample("backend_stage_seconds_sum", **stage)
+
+    @metrics.timed("test_generator")
+    def generate():
+        yield 1
+        time.sleep(0.05)
+        yield 2
+
+    assert list(generate()) == [1, 2]
+    assert get_sample("backend_stage_seconds_sum", **stage) - seconds >= 0.05
+    partial = generate()
+    next(partial)
+    partial.close()
+    assert get_sample("backend_stage_seconds_count", **stage) == count + 2
+
+
+def test_timed_disabled(monkeypatch):
+    def function():
+        return 1
+
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.timed("function")(function) is function
+    assert client.get("/metrics").status_code == 404
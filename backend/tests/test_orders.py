@@ -1,6 +1,13 @@
+import threading
+
+import numpy as np
 from fastapi.testclient import TestClient
+from global_land_mask import globe
+from openrouteservice import exceptions
 
 from application.main import app
+from application.models.Delivery import Delivery
+from application.models.Depot import Depot
 from application.routes import orders
 
 client = TestClient(app)
@@ -18,3 +25,112 @@ def test_get_random_orders():
 #    for item in res:
 #        assert (item[1] > 51.7614017) and (item[1] < 52.2614017)
 #        assert (item[2] > 4.1083900) and (item[2] < 4.6083900)
+
+
+def test_sample_coordinates():
+    center = (52.0114017, 4.3583900)
+    res = orders.sample_coordinates(center, 10000, 10000, np.random.default_rng(1))
+
+    assert res.shape == (10000, 2)
+    distances = np.hypot((res[:, 0] - center[0]) * orders.METRES_LAT,
+                         (res[:, 1] - center[1]) * orders.METRES_LON * np.cos(np.radians(center[0])))
+    assert distances.max() <= 10000
+    # Points are spread evenly over the disk, so a quarter of them lie within half the radius.
+    assert 0.2 < (distances < 5000).mean() < 0.3
+    assert globe.is_land(res[:, 0], res[:, 1]).all()
+    assert (orders.sample_coordinates(center, 10000, 5, np.random.default_rng(2)) ==
+            orders.sample_coordinates(center, 10000, 5, np.random.default_rng(2))).all()
+
+    # In the North Sea there is no land to be found, so the depot itself is used.
+    assert (orders.sample_coordinates((52.3, 3.0), 1000, 2, np.random.default_rng(1)) == [52.3, 3.0]).all()
+
+
+def test_snap_orders(monkeypatch):
+    from application.services.road_snapper import RoadSnapper
+    from test_road_router import make_graph
+    snapper = RoadSnapper(make_graph())
+    monkeypatch.setattr(orders, "get_snapper", lambda path: snapper)
+    candidates = np.array([[[52.0003, 4.415], [52.0051, 4.4201]],
+                           [[52.0051, 4.4201], [52.0003, 4.415]],
+                           [[51.9, 4.3], [51.99, 4.41]]])
+
+    res = orders.snap_orders([10, 11, 12], candidates)
+
+    assert [d.id for d in res] == [11, 12, 13]
+    assert (res[0].latitude, res[0].longitude) == (52.0, 4.415)
+    assert (res[1].latitude, res[1].longitude) == (52.0051, 4.42)
+    assert (res[2].latitude, res[2].longitude) == (52.0, 4.41)
+
+
+class FakeMatrixClient:
+    """
+    Answers distance matrices like ORS, failing the whole matrix when it contains a point in the sea at longitude 0.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def distance_matrix(self, locations, profile, metrics, sources, destinations):
+        self.calls += 1
+        if any(locations[i][0] == 0 for i in destinations):
+            raise exceptions.ApiError(404, {"error": {"code": 6010}})
+        return {"distances": [[None if locations[j][1] > 60 else 100.0 for j in destinations] for i in sources]}
+
+
+def test_validate_ors():
+    client = FakeMatrixClient()
+    depots = [Depot(id=1, latitude=52.0, longitude=4.4), Depot(id=2, latitude=52.1, longitude=4.5)]
+    deliveries = [Delivery.from_raw_data(i + 1, 52.0, 4.4, 1) for i in range(16)]
+    deliveries[3] = Delivery.from_raw_data(4, 52.0, 0, 1)
+    deliveries[9] = Delivery.from_raw_data(10, 70.0, 4.4, 1)
+
+    rejected = orders.validate_ors(client, deliveries, depots)
+
+    assert [d.id for d in rejected] == [4, 10]
+    assert client.calls < 16
+
+
+def test_get_random_orders_regenerates_rejected(monkeypatch):
+    validated = []
+
+    def validate(deliveries, depot_data):
+        validated.append(sorted(d.id for d in deliveries))
+        return [d for d in deliveries if d.latitude > 51.926484] if len(validated) == 1 else []
+
+    monkeypatch.setattr(orders, "validate_orders", validate)
+    monkeypatch.setattr(orders, "get_single_order",
+                        lambda index, candidates: Delivery.from_raw_data(index + 1, *candidates[0], 1))
+    monkeypatch.setattr(orders.settings, "ROUTING_GRAPH_PATH", "./missing.graphml")
+
+    res = orders.get_random_orders(12, 5000, seed=3)
+
+    assert [d.id for d in res] == list(range(1, 13))
+    assert len(validated) == 2 and 0 < len(validated[1]) < 12
+    first = orders.generator(orders.load_depots('./application/assets/depots.csv'), 5000, 12, [3, 0])
+    assert [(d.latitude, d.longitude) for d in res if d.id not in validated[1]] == \
+        [(d.latitude, d.longitude) for d in first if d.id not in validated[1]]
+
+
+def test_order_depot():
+    factory = orders.make_order_factory([None] * 3, 1000, 10)
+
+    assert [orders.order_depot(factory, i) for i in range(10)] == [1, 1, 1, 2, 2, 2, 3, 3, 3, 3]
+
+
+def test_stream_orders_by_depot(monkeypatch):
+    release = threading.Event()
+
+    def get_single_order(index, candidates):
+        if index < 3:
+            release.wait(5)
+        return Delivery.from_raw_data(index + 1, *candidates[0], 1)
+
+    monkeypatch.setattr(orders, "get_single_order", get_single_order)
+    monkeypatch.setattr(orders.settings, "ROUTING_GRAPH_PATH", "./missing.graphml")
+    depots = [Depot(id=1, latitude=51.92, longitude=4.45), Depot(id=2, latitude=52.0, longitude=4.35)]
+
+    batches = orders.stream_orders([(depots[0], [0, 1, 2], 1), (depots[1], [3, 4], 2)], 5000)
+
+    assert [d.id for d in next(batches)] == [4, 5]
+    release.set()
+    assert [d.id for d in next(batches)] == [1, 2, 3]
+    assert next(batches, None) is None
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from openrouteservice import exceptions
+
+from application.services import ors_gateway
+from application.services.ors_gateway import OrsGateway, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.request = None
+
+    def json(self):
+        return self.body
+
+
+def make_gateway(monkeypatch, responses, retries=3):
+    gateway = OrsGateway("key", retries=retries, backoff=0.001)
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append((method, url, kwargs))
+        response = responses.pop(0)
+        kwargs["hooks"]["response"](response)
+        return response
+
+    monkeypatch.setattr(gateway._session, "request", request)
+    monkeypatch.setattr(ors_gateway.time, "sleep", lambda seconds: None)
+    return gateway, calls
+
+
+def test_gateway_retries(monkeypatch):
+    body = {"routes": []}
+    gateway, calls = make_gateway(monkeypatch, [FakeResponse(429, {}), FakeResponse(503, {}), FakeResponse(200, body)])
+
+    assert gateway.directions([[4.1, 52.1], [4.2, 52.2]], profile='driving-car') == body
+    assert len(calls) == 3
+    assert calls[0][0] == "POST"
+    assert calls[0][1].startswith("https://api.openrouteservice.org/v2/directions/driving-car/json")
+    assert calls[0][2]["headers"]["Authorization"] == "key"
+    stats = gateway.metrics.snapshot()["/v2/directions/driving-car/json"]
+    assert (stats.requests, stats.errors, stats.retries) == (3, 2, 2)
+
+
+def test_gateway_gives_up(monkeypatch):
+    gateway, calls = make_gateway(monkeypatch, [FakeResponse(429, {})] * 3 + [FakeResponse(400, {"error": "bad"})],
+                                  retries=2)
+    with pytest.raises(exceptions._OverQueryLimit):
+        gateway.directions([[4.1, 52.1], [4.2, 52.2]])
+    assert len(calls) == 3
+
+    # Errors in the request itself are not retried.
+    with pytest.raises(exceptions.ApiError):
+        gateway.directions([[4.1, 52.1], [4.2, 52.2]])
+    assert len(calls) == 4
+
+
+def test_gateway_honours_retry_after(monkeypatch):
+    gateway, calls = make_gateway(monkeypatch, [FakeResponse(503, {}, {"Retry-After": "7"})] * 2, retries=1)
+    sleeps = []
+    monkeypatch.setattr(ors_gateway.time, "sleep", sleeps.append)
+
+    with pytest.raises(exceptions.ApiError) as error:
+        gateway.directions([[4.1, 52.1], [4.2, 52.2]])
+    assert error.value.status == 503
+    assert len(calls) == 2 and sleeps == [7.0]
+
+
+def test_rate_limit_only_for_public_api(monkeypatch):
+    monkeypatch.setattr(ors_gateway, "gateways", {})
+
+    assert ors_gateway.get_gateway("key").bucket.rate == ors_gateway.settings.ORS_RATE_LIMIT
+    assert ors_gateway.get_gateway(base_url="http://localhost:8080/ors").bucket.rate == 0
+
+
+def test_gateway_async(monkeypatch):
+    body = {"routes": []}
+    gateway, calls = make_gateway(monkeypatch, [FakeResponse(200, body)])
+
+    assert asyncio.run(gateway.call_async("directions", [[4.1, 52.1], [4.2, 52.2]])) == body
+
+
+def test_token_bucket():
+    bucket = TokenBucket(10, 2)
+    assert [round(bucket.delay(), 1) for i in range(4)] == [0, 0, 0.1, 0.2]
+    assert TokenBucket(0, 1).delay() == 0
@@ -0,0 +1,32 @@
+import time
+
+from application.services.result_cache import ResultCache, canonical_key
+from application.models.Vehicle import Vehicle
+
+
+def test_canonical_key():
+    assert canonical_key(1, {"a": 1, "b": [2, 3]}) == canonical_key(1, {"b": [2, 3], "a": 1})
+    assert canonical_key(1, {"a": 1}) != canonical_key(0, {"a": 1})
+    vehicle = Vehicle(id=1, depot=0, capacity=10)
+    assert canonical_key([vehicle]) == canonical_key([Vehicle(id=1, depot=0, capacity=10)])
+    assert canonical_key([vehicle]) != canonical_key([Vehicle(id=1, depot=0, capacity=11)])
+
+
+def test_result_cache_evicts_and_expires():
+    cache = ResultCache(10, 60)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") is not None
+    cache.put("c", b"123")
+    # "b" was used least recently, so it is forgotten to make room for "c".
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"12345"
+    assert cache.get("c") is not None
+    cache.put("d", b"12345678901")
+    assert cache.get("d") is None
+
+    cache = ResultCache(10, 0.01)
+    cache.put("a", b"1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.used == 0
@@ -0,0 +1,91 @@
+import random
+
+import networkx as nx
+import pytest
+
+from application.services.road_router import RoadRouter
+
+
+def make_graph():
+    """
+    A ladder of two parallel roads, where the bottom road is shorter and the top road is the only way back.
+    """
+    graph = nx.MultiDiGraph()
+    for i in range(4):
+        graph.add_node(i, x=4.40 + i * 0.01, y=52.00)
+        graph.add_node(10 + i, x=4.40 + i * 0.01, y=52.01)
+    for i in range(3):
+        graph.add_edge(i, i + 1, length=700.0)
+        graph.add_edge(10 + i + 1, 10 + i, length=700.0, travel_time=35.0)
+        graph.add_edge(10 + i, 10 + i + 1, length=900.0)
+    for i in range(4):
+        graph.add_edge(i, 10 + i, length=1100.0)
+        graph.add_edge(10 + i, i, length=1100.0)
+    return graph
+
+
+def test_directions_shape():
+    router = RoadRouter(make_graph())
+
+    distance, geometry, segments = router.directions([[4.401, 52.001], [4.429, 51.999], [4.399, 52.011]])
+
+    assert distance == 2100.0 + 1100.0 + 2100.0
+    assert [s["distance"] for s in segments] == [2100.0, 3200.0]
+    assert segments[1]["duration"] == round(1100.0 / (50 / 3.6) + 3 * 35.0, 1)
+    assert geometry[0] == [4.40, 52.00]
+    assert geometry[-1] == [4.40, 52.01]
+    assert len(geometry) == 1 + 3 + 4
+
+
+def test_component():
+    graph = make_graph()
+    graph.add_edge(3, 20, length=100.0)
+    graph.nodes[20].update(x=4.44, y=52.00)
+    router = RoadRouter(graph)
+
+    assert router.component(0) == router.component(13)
+    assert router.component(20) != router.component(0)
+
+
+def test_shortest_path_matches_dijkstra():
+    graph = nx.MultiDiGraph()
+    rng = random.Random(5)
+    for i in range(15):
+        for j in range(15):
+            graph.add_node(i * 15 + j, x=4.40 + j * 0.002 + rng.uniform(0, 0.001), y=52.00 + i * 0.002)
+    router = RoadRouter(graph)
+    for u in graph.nodes:
+        for v in (u + 1, u + 15):
+            if v in graph.nodes and (v != u + 1 or v % 15) and rng.random() < 0.8:
+                length = router.heuristic(u, v) * rng.uniform(1, 1.5)
+                graph.add_edge(u, v, length=length)
+                if rng.random() < 0.7:
+                    graph.add_edge(v, u, length=length)
+
+    for source, target in [(0, 224), (14, 210), (112, 3), (200, 17)]:
+        try:
+            expected = nx.dijkstra_path_length(graph, source, target, weight='length')
+        except nx.NetworkXNoPath:
+            with pytest.raises(nx.NetworkXNoPath):
+                router.shortest_path(source, target)
+            continue
+        path = router.shortest_path(source, target)
+        assert path[0] == source and path[-1] == target
+        assert sum(router.edge(u, v)['length'] for u, v in zip(path, path[1:])) == pytest.approx(expected)
+
+
+def test_load_uses_osmnx_012_signature(monkeypatch):
+    import osmnx as ox
+    calls = []
+
+    def load_graphml(filename, folder=None):
+        calls.append((filename, folder))
+        graph = make_graph()
+        graph.edges[11, 10, 0]['travel_time'] = "35.0"
+        return graph
+
+    monkeypatch.setattr(ox, "load_graphml", load_graphml)
+    router = RoadRouter.load("./application/assets/road_graph.graphml")
+
+    assert calls == [("road_graph.graphml", "./application/assets")]
+    assert router.graph.edges[11, 10, 0]['travel_time'] == 35.0
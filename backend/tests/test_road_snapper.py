@@ -0,0 +1,48 @@
+import numpy as np
+from shapely.geometry import LineString
+
+from application.services.road_snapper import RoadSnapper
+from test_road_router import make_graph
+
+
+def brute_force(snapper, points):
+    """
+    Snaps points by comparing them with every segment of the snapper.
+    """
+    res = []
+    for point in np.asarray(points)[:, ::-1] * snapper.scale:
+        projected, distances = snapper.project(np.tile(point, (len(snapper.a), 1)), np.arange(len(snapper.a)))
+        res.append(distances.min())
+    return np.array(res)
+
+
+def test_snap_to_edges():
+    snapper = RoadSnapper(make_graph())
+
+    snapped, distances = snapper.snap([[52.0003, 4.415], [52.0051, 4.4201], [51.9, 4.3]])
+
+    assert np.allclose(snapped[0], [52.00, 4.415])
+    assert abs(distances[0] - 0.0003 * 110540.0) < 0.1
+    assert np.allclose(snapped[1], [52.0051, 4.42])
+    assert np.allclose(snapped[2], [52.00, 4.40])
+
+
+def test_snap_to_geometry():
+    graph = make_graph()
+    graph.add_edge(3, 13, geometry=LineString([(4.43, 52.00), (4.44, 52.005), (4.43, 52.01)]), length=1500.0)
+    snapper = RoadSnapper(graph)
+
+    snapped, distances = snapper.snap([[52.005, 4.4401]])
+
+    assert np.allclose(snapped[0], [52.005, 4.44])
+    assert distances[0] < 10
+
+
+def test_snap_matches_brute_force():
+    snapper = RoadSnapper(make_graph(), cell_size=50.0)
+    rng = np.random.default_rng(4)
+    points = np.column_stack((rng.uniform(51.99, 52.02, 2000), rng.uniform(4.39, 4.44, 2000)))
+
+    snapped, distances = snapper.snap(points)
+
+    assert np.allclose(distances, brute_force(snapper, points))